@@ -0,0 +1,18 @@
+# gunicorn.conf.py
+"""
+Production server for src.api on Linux/macOS: a gunicorn master with uvicorn workers
+(uvloop + httptools when installed, as with `uvicorn --loop uvloop --http httptools`).
+
+    gunicorn src.api:app -c gunicorn.conf.py
+
+preload_app imports the app once in the master, and with it the CatBoost model that
+src.predict loads at import. Workers are forked from the master, so they share the parsed
+model's memory copy-on-write instead of each parsing the .cbm again. The DB pool, hashing
+pool and Redis client are opened per worker in the app lifespan, after the fork.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
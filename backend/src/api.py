@@ -1,22 +1,38 @@
 # src/api.py
 import os
 import json
+import time
+import queue
+import base64
+import atexit
+import hashlib
+import asyncio
 import logging
+import logging.handlers
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Optional, Generator, List
+from typing import Optional, List
 
-import bcrypt
 import jwt  # PyJWT
-import psycopg2
-from psycopg2 import pool
-from psycopg2.extensions import connection as PsycopgConnection
+import psycopg
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, HTTPException, Request, Depends, status, APIRouter
+from cachetools import TTLCache
+from prometheus_client import make_asgi_app
+from fastapi import FastAPI, HTTPException, Request, Depends, status, APIRouter, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, constr
 
+from src import bcrypt_pool, cache, db, doctor_queries
+from src.db import get_db_conn
 from src.predict import predict_resistance
+from src.schemas import (
+    LoginRequest, TokenResponse, ValidateResponse, RefreshRequest,
+    PredictionRequest, PredictionResponse, DashboardStats,
+    DoctorCreate, DoctorUpdate, DoctorBulkUpdate, DoctorOut, HospitalCreate, HospitalUpdate, HospitalOut, DetailResponse,
+)
 
 
 # === Load env ===
@@ -24,36 +40,102 @@ load_dotenv()
 
 
 # === Config / env validation ===
-DB_NAME = os.getenv("POSTGRES_DB")
-DB_USER = os.getenv("POSTGRES_USER")
-DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
-DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
-DB_PORT = os.getenv("POSTGRES_PORT", "5432")
+# DB settings live in src/db.py
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
-POOL_MINCONN = int(os.getenv("DB_POOL_MIN", "1"))
-POOL_MAXCONN = int(os.getenv("DB_POOL_MAX", "10"))
+WRITE_BATCH_SIZE = 500  # rows per COPY for the background log writers
+WRITE_FLUSH_INTERVAL = 0.2  # seconds a partial batch may wait before it is written
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", "30"))
 
 REQUIRED = {
-    "POSTGRES_DB": DB_NAME,
-    "POSTGRES_USER": DB_USER,
-    "POSTGRES_PASSWORD": DB_PASSWORD,
     "JWT_SECRET": JWT_SECRET,
 }
 missing = [k for k, v in REQUIRED.items() if not v]
 if missing:
     raise RuntimeError(f"Missing required env vars: {missing}")
 
+# Resolved once: PyJWT would look up the algorithm and re-prepare the key on every decode
+_JWT_ALG = jwt.get_algorithm_by_name(JWT_ALGORITHM)
+_JWT_KEY = _JWT_ALG.prepare_key(JWT_SECRET)
+
 
 # === Logging ===
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+# Handlers only enqueue records; a listener thread does the actual stream writes
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",  # applied by the QueueHandler before enqueueing
+    handlers=[logging.handlers.QueueHandler(_log_queue)],
+)
 logger = logging.getLogger("medportal-api")
 
 
+# === Hot statements (executed with prepare=True: parsed and planned once per pooled connection) ===
+PREPARED_STATEMENTS = {
+    "login_lookup": "SELECT password_hash, role FROM medportal.doctors WHERE doctor_id = %s",
+    "session_ins": "INSERT INTO medportal.sessions (doctor_id, refresh_token_hash, expires_at) VALUES (%s, %s, %s)",
+    # Check and rotate in one round trip: no row back means unknown or expired token
+    "session_rotate": (
+        "UPDATE medportal.sessions SET refresh_token_hash = %s, expires_at = %s "
+        "WHERE doctor_id = %s AND refresh_token_hash = %s AND expires_at >= %s RETURNING id"
+    ),
+    # LIMIT NULL means no limit, OFFSET NULL means 0
+    "list_hospitals": (
+        "SELECT hospital_id AS id, name, region, status FROM public.hospitals "
+        "ORDER BY hospital_id LIMIT %s OFFSET %s"
+    ),
+    "list_doctors": (
+        "SELECT doctor_id AS id, name, role, region, hospital, status FROM medportal.doctors "
+        "ORDER BY doctor_id LIMIT %s OFFSET %s"
+    ),
+    # Fixed-shape partial updates: a NULL parameter keeps the current value
+    "hospital_update": (
+        "UPDATE public.hospitals SET name = COALESCE(%s, name), region = COALESCE(%s, region), "
+        "status = COALESCE(%s, status), updated_at = NOW() "
+        "WHERE hospital_id = %s RETURNING hospital_id AS id, name, region, status"
+    ),
+    "doctor_update": (
+        "UPDATE medportal.doctors SET name = COALESCE(%s, name), role = COALESCE(%s, role), "
+        "region = COALESCE(%s, region), hospital = COALESCE(%s, hospital), "
+        "status = COALESCE(%s, status), password_hash = COALESCE(%s, password_hash), updated_at = NOW() "
+        "WHERE doctor_id = %s RETURNING doctor_id AS id, name, role, region, hospital, status"
+    ),
+}
+
+
+# === App lifecycle ===
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _audit_queue, _audit_task, _prediction_queue, _prediction_task
+    logger.info("Starting MedPortal API + Admin API...")
+    async with db.lifespan(app):
+        bcrypt_pool.start()
+        await cache.open_client()
+        _audit_queue = asyncio.Queue()
+        _audit_task = asyncio.create_task(_batch_flusher(_audit_queue, AUDIT_COPY, "audit"))
+        _prediction_queue = asyncio.Queue()
+        _prediction_task = asyncio.create_task(_batch_flusher(_prediction_queue, PREDICTION_COPY, "prediction log"))
+
+        yield
+
+        # Sentinel: each flusher writes everything queued before it, then exits.
+        # Both must finish before the DB pool closes.
+        _audit_queue.put_nowait(None)
+        _prediction_queue.put_nowait(None)
+        await asyncio.gather(_audit_task, _prediction_task)
+        _audit_task = _prediction_task = None
+        await cache.close_client()
+        bcrypt_pool.shutdown()
+
+
 # === FastAPI app ===
-app = FastAPI(title="MedPortal API")
+app = FastAPI(title="MedPortal API", lifespan=lifespan)
+app.mount("/metrics", make_asgi_app())
 
 app.add_middleware(
     CORSMiddleware,
@@ -64,51 +146,6 @@ app.add_middleware(
 )
 
 
-# === DB pool (shared across all endpoints) ===
-_db_pool: Optional[pool.SimpleConnectionPool] = None
-
-
-def get_db_conn() -> Generator[PsycopgConnection, None, None]:
-    """Reusable DB dependency with auto commit/rollback"""
-    global _db_pool
-    if _db_pool is None:
-        raise RuntimeError("DB pool not initialized")
-    conn = _db_pool.getconn()
-    try:
-        yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        _db_pool.putconn(conn)
-
-
-# === App lifecycle ===
-@app.on_event("startup")
-def startup():
-    global _db_pool
-    logger.info("Starting MedPortal API + Admin API...")
-    _db_pool = psycopg2.pool.SimpleConnectionPool(
-        POOL_MINCONN,
-        POOL_MAXCONN,
-        host=DB_HOST,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        port=DB_PORT,
-    )
-    logger.info("Database pool ready (%d-%d connections)", POOL_MINCONN, POOL_MAXCONN)
-
-
-@app.on_event("shutdown")
-def shutdown():
-    global _db_pool
-    if _db_pool:
-        logger.info("Closing database pool...")
-        _db_pool.closeall()
-
-
 # === JWT helpers ===
 def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -122,86 +159,54 @@ def create_refresh_token(subject: str, expires_delta: Optional[timedelta] = None
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
-def decode_token(token: str) -> dict:
-    try:
-        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-
-# === Pydantic Models - Public API ===
-class LoginRequest(BaseModel):
-    doctor_id: str = Field(..., min_length=6, max_length=6, pattern=r"^\d{6}$")
-    password: str = Field(..., min_length=1)
-
-
-class TokenResponse(BaseModel):
-    access_token: str
-    token_type: str = "bearer"
-    expires_in: int
-    refresh_token: Optional[str] = None
-    role: Optional[str] = None
-
-
-class ValidateResponse(BaseModel):
-    valid: bool
-    doctor_id: Optional[str] = None
-    expires_at: Optional[datetime] = None
-
-
-class RefreshRequest(BaseModel):
-    refresh_token: str
-
-
-class PredictionRequest(BaseModel):
-    age: int
-    weight_kg: float
-    gender: str
-    admission_date: str
-    cancer_type: str
-    pathogen_id: int
-    antibiotic_id: int
-    duration_days: int
-    region: str
+def token_digest(token: str) -> bytes:
+    # Sessions store only SHA-256 of the refresh token: fixed 32 bytes to index, nothing usable at rest
+    return hashlib.sha256(token.encode("utf-8")).digest()
 
 
-# === Pydantic Models - Admin API ===
-class DoctorCreate(BaseModel):
-    name: str
-    doctor_id: constr(min_length=6, max_length=6)
-    password: str
-    role: str = "Doctor"
-    region: str
-    hospital: str
-    status: str = "Active"
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
 
 
-class DoctorUpdate(BaseModel):
-    name: Optional[str] = None
-    role: Optional[str] = None
-    region: Optional[str] = None
-    hospital: Optional[str] = None
-    status: Optional[str] = None
-    password: Optional[str] = None
-
+def decode_token(token: str) -> dict:
+    """Verify and decode one of our own tokens: pinned algorithm, cached key, exp required."""
+    try:
+        signing_input, _, signature = token.rpartition(".")
+        header_segment, _, payload_segment = signing_input.partition(".")
+        header = json.loads(_b64url_decode(header_segment))
+        # Valid JSON need not be an object (e.g. [] or "x"): check the type before .get()
+        if not isinstance(header, dict) or header.get("alg") != JWT_ALGORITHM:
+            raise ValueError("unexpected header")
+        if not _JWT_ALG.verify(signing_input.encode("ascii"), _JWT_KEY, _b64url_decode(signature)):
+            raise ValueError("bad signature")
+        payload = json.loads(_b64url_decode(payload_segment))
+        if not isinstance(payload, dict) or not isinstance(payload.get("exp"), (int, float)):
+            raise ValueError("bad claims")
+        exp = payload["exp"]
+    except (ValueError, TypeError, KeyError, UnicodeError):
+        # json/base64 errors are ValueError subclasses
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    if exp <= time.time():
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
+    return payload
 
-class HospitalCreate(BaseModel):
-    name: str
-    region: str
-    status: str = "Active"
 
+# === Utility: background log writers ===
+# Audit and prediction rows have no read-after-write requirement: handlers only queue
+# them and a background task per table COPYs them in batches, off the request path.
+AUDIT_COPY = "COPY medportal.auth_audit (doctor_id, ip_address, user_agent, action, success, reason) FROM STDIN"
+PREDICTION_COPY = (
+    "COPY public.prediction_logs (doctor_id, age, weight_kg, gender, admission_date, cancer_type, "
+    "pathogen_id, antibiotic_id, duration_days, region, result) FROM STDIN"
+)
 
-class HospitalUpdate(BaseModel):
-    name: Optional[str] = None
-    region: Optional[str] = None
-    status: Optional[str] = None
+_audit_queue: Optional[asyncio.Queue] = None
+_audit_task: Optional[asyncio.Task] = None
+_prediction_queue: Optional[asyncio.Queue] = None
+_prediction_task: Optional[asyncio.Task] = None
 
 
-# === Utility: audit logging ===
 def write_audit(
-    conn,
     doctor_id: Optional[str],
     ip: str,
     user_agent: str,
@@ -209,15 +214,74 @@ def write_audit(
     success: bool,
     reason: Optional[str] = None,
 ):
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO medportal.auth_audit
-            (doctor_id, ip_address, user_agent, action, success, reason)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """,
-            (doctor_id, ip, user_agent, action, success, reason),
-        )
+    _audit_queue.put_nowait((doctor_id, ip, user_agent, action, success, reason))
+
+
+def log_prediction(req: PredictionRequest, prediction: dict, doctor_id: str = "D00001"):
+    _prediction_queue.put_nowait((
+        doctor_id[:6],
+        req.age, req.weight_kg, req.gender, req.admission_date,
+        req.cancer_type, req.pathogen_id, req.antibiotic_id,
+        req.duration_days, req.region, Jsonb(prediction),
+    ))
+
+
+async def _copy_rows(copy_sql: str, rows: List[tuple]):
+    # The pool context commits on success and rolls back on error
+    async with db.pool.connection() as conn:
+        async with conn.cursor() as cur:
+            async with cur.copy(copy_sql) as copy:
+                for row in rows:
+                    await copy.write_row(row)
+
+
+async def _copy_rows_one_by_one(copy_sql: str, rows: List[tuple], label: str):
+    """Fallback after a failed batch: each row in its own transaction, so a bad row loses only itself."""
+    async with db.pool.connection() as conn:
+        for row in rows:
+            try:
+                async with conn.transaction():
+                    async with conn.cursor() as cur:
+                        async with cur.copy(copy_sql) as copy:
+                            await copy.write_row(row)
+            except psycopg.Error:
+                if conn.closed:
+                    raise
+                logger.exception("Dropped one %s row", label)
+
+
+async def _drain(queue: asyncio.Queue, max_items: int, timeout: float) -> list:
+    """Wait for one item, then collect more until max_items, timeout seconds or the None sentinel."""
+    items = [await queue.get()]
+    deadline = asyncio.get_running_loop().time() + timeout
+    while items[-1] is not None and len(items) < max_items:
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            break
+        try:
+            items.append(await asyncio.wait_for(queue.get(), remaining))
+        except asyncio.TimeoutError:
+            break
+    return items
+
+
+async def _batch_flusher(queue: asyncio.Queue, copy_sql: str, label: str):
+    while True:
+        rows = await _drain(queue, WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL)
+        stopping = rows[-1] is None
+        if stopping:
+            rows.pop()
+        if rows:
+            try:
+                await _copy_rows(copy_sql, rows)
+            except Exception:
+                logger.exception("Failed to write %d %s rows as one batch; retrying row by row", len(rows), label)
+                try:
+                    await _copy_rows_one_by_one(copy_sql, rows, label)
+                except Exception:
+                    logger.exception("Failed to write %d %s rows", len(rows), label)
+        if stopping:
+            return
 
 
 # === Health & Root ===
@@ -239,14 +303,14 @@ DEMO_DOCTOR_ID = "111111"
 DEMO_PASSWORD = "demo"
 
 
-@app.post("/login")
-def login(request_data: LoginRequest, request: Request, conn=Depends(get_db_conn)):
+@app.post("/login", response_model=TokenResponse)
+async def login(request_data: LoginRequest, request: Request, conn=Depends(get_db_conn)):
     client_ip = request.client.host if request.client else "unknown"
     user_agent = request.headers.get("user-agent", "")
 
     # Demo bypass so you can log in and use Admin to add/reset real doctors
     if request_data.doctor_id == DEMO_DOCTOR_ID and request_data.password == DEMO_PASSWORD:
-        write_audit(conn, request_data.doctor_id, client_ip, user_agent, "login_success", True)
+        write_audit(request_data.doctor_id, client_ip, user_agent, "login_success", True)
         return {
             "access_token": create_access_token(request_data.doctor_id),
             "refresh_token": create_refresh_token(request_data.doctor_id),
@@ -255,46 +319,52 @@ def login(request_data: LoginRequest, request: Request, conn=Depends(get_db_conn
             "role": "Admin",
         }
 
-    with conn.cursor() as cur:
-        cur.execute(
-            "SELECT password_hash, role FROM medportal.doctors WHERE doctor_id = %s",
-            (request_data.doctor_id,),
-        )
-        row = cur.fetchone()
+    async with conn.cursor() as cur:
+        await cur.execute(PREPARED_STATEMENTS["login_lookup"], (request_data.doctor_id,), prepare=True)
+        row = await cur.fetchone()
 
     if not row:
-        write_audit(conn, request_data.doctor_id, client_ip, user_agent, "login_attempt", False, "doctor_not_found")
+        # Same hash cost as a real check: no ID enumeration by timing, predictable pool load
+        await bcrypt_pool.verify_dummy_async(request_data.password)
+        write_audit(request_data.doctor_id, client_ip, user_agent, "login_attempt", False, "doctor_not_found")
         raise HTTPException(status_code=401, detail="Invalid ID or password")
 
     stored_hash = row[0]
     if not stored_hash or (isinstance(stored_hash, str) and not stored_hash.strip()):
-        write_audit(conn, request_data.doctor_id, client_ip, user_agent, "login_attempt", False, "no_password_set")
+        write_audit(request_data.doctor_id, client_ip, user_agent, "login_attempt", False, "no_password_set")
         raise HTTPException(status_code=401, detail="Password not set. Use Admin to reset password.")
     if isinstance(stored_hash, str):
         stored_hash = stored_hash.encode("utf-8")
-    # Try UTF-8 first (Admin panel / API), then default encoding (create_doctor.py or older scripts)
-    password_utf8 = request_data.password.encode("utf-8")
-    password_default = request_data.password.encode()
     try:
-        ok = bcrypt.checkpw(password_utf8, stored_hash) or bcrypt.checkpw(password_default, stored_hash)
-    except Exception:
+        ok = await bcrypt_pool.verify_async(request_data.password, stored_hash)
+    except ValueError:  # malformed stored hash
         ok = False
     if not ok:
-        write_audit(conn, request_data.doctor_id, client_ip, user_agent, "login_attempt", False, "wrong_password")
+        write_audit(request_data.doctor_id, client_ip, user_agent, "login_attempt", False, "wrong_password")
         raise HTTPException(status_code=401, detail="Invalid ID or password")
 
+    if bcrypt_pool.needs_rehash(stored_hash):
+        # Only now do we hold the plaintext, so this is where bcrypt -> argon2id migration happens
+        new_hash = await bcrypt_pool.hash_async(request_data.password)
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "UPDATE medportal.doctors SET password_hash = %s WHERE doctor_id = %s",
+                (new_hash, request_data.doctor_id),
+            )
+
     access_token = create_access_token(request_data.doctor_id)
     refresh_token = create_refresh_token(request_data.doctor_id)
     expires_in = ACCESS_TOKEN_EXPIRE_MINUTES * 60
 
     refresh_expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    with conn.cursor() as cur:
-        cur.execute(
-            "INSERT INTO medportal.sessions (doctor_id, refresh_token, expires_at) VALUES (%s, %s, %s)",
-            (request_data.doctor_id, refresh_token, refresh_expires_at),
+    async with conn.cursor() as cur:
+        await cur.execute(
+            PREPARED_STATEMENTS["session_ins"],
+            (request_data.doctor_id, token_digest(refresh_token), refresh_expires_at),
+            prepare=True,
         )
 
-    write_audit(conn, request_data.doctor_id, client_ip, user_agent, "login_success", True)
+    write_audit(request_data.doctor_id, client_ip, user_agent, "login_success", True)
 
     role_from_db = row[1]
     if not role_from_db or not role_from_db.strip():
@@ -302,7 +372,7 @@ def login(request_data: LoginRequest, request: Request, conn=Depends(get_db_conn
 
     final_role = role_from_db.strip()
 
-    print(f"LOGIN SUCCESS → doctor_id={request_data.doctor_id} → role='{final_role}'")
+    logger.info("login_success doctor_id=%s role=%s", request_data.doctor_id, final_role)
 
     return {
         "access_token": access_token,
@@ -324,7 +394,7 @@ def validate_session(token: str):
 
 
 @app.post("/token/refresh", response_model=TokenResponse)
-def refresh_token(body: RefreshRequest, request: Request, conn=Depends(get_db_conn)):
+async def refresh_token(body: RefreshRequest, request: Request, conn=Depends(get_db_conn)):
     client_ip = request.client.host or "unknown"
     user_agent = request.headers.get("user-agent", "")
 
@@ -334,28 +404,24 @@ def refresh_token(body: RefreshRequest, request: Request, conn=Depends(get_db_co
 
     doctor_id = payload["sub"]
 
-    with conn.cursor() as cur:
-        cur.execute(
-            "SELECT id, expires_at FROM medportal.sessions WHERE doctor_id = %s AND refresh_token = %s",
-            (doctor_id, body.refresh_token),
-        )
-        row = cur.fetchone()
-
-    if not row or row[1] < datetime.utcnow():
-        write_audit(conn, doctor_id, client_ip, user_agent, "refresh_failure", False, "invalid_or_expired")
-        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
-
+    now = datetime.utcnow()
     new_access = create_access_token(doctor_id)
     new_refresh = create_refresh_token(doctor_id)
-    new_exp = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    new_exp = now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
 
-    with conn.cursor() as cur:
-        cur.execute(
-            "UPDATE medportal.sessions SET refresh_token = %s, expires_at = %s WHERE id = %s",
-            (new_refresh, new_exp, row[0]),
+    async with conn.cursor() as cur:
+        await cur.execute(
+            PREPARED_STATEMENTS["session_rotate"],
+            (token_digest(new_refresh), new_exp, doctor_id, token_digest(body.refresh_token), now),
+            prepare=True,
         )
+        row = await cur.fetchone()
+
+    if not row:
+        write_audit(doctor_id, client_ip, user_agent, "refresh_failure", False, "invalid_or_expired")
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
 
-    write_audit(conn, doctor_id, client_ip, user_agent, "refresh_success", True)
+    write_audit(doctor_id, client_ip, user_agent, "refresh_success", True)
     return {
         "access_token": new_access,
         "token_type": "bearer",
@@ -367,89 +433,92 @@ def refresh_token(body: RefreshRequest, request: Request, conn=Depends(get_db_co
 # ============================
 # PREDICTION & DASHBOARD
 # ============================
-def log_prediction(req: dict, prediction: dict, doctor_id: str = "D00001"):
-    try:
-        conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO public.prediction_logs
-            (doctor_id, age, weight_kg, gender, admission_date, cancer_type,
-             pathogen_id, antibiotic_id, duration_days, region, result)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                doctor_id[:6],
-                req["age"], req["weight_kg"], req["gender"], req.get("admission_date"),
-                req["cancer_type"], req["pathogen_id"], req["antibiotic_id"],
-                req["duration_days"], req.get("region"), json.dumps(prediction)
-            ),
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
-    except Exception as e:
-        logger.exception("Failed to log prediction: %s", e)
+# Dashboard aggregates scan all of prediction_logs; second-level freshness is not needed
+_stats_cache: TTLCache = TTLCache(maxsize=1, ttl=DASHBOARD_CACHE_TTL)
+_stats_lock = asyncio.Lock()
 
 
-@app.post("/predict")
-def predict(req: PredictionRequest):
-    result = predict_resistance(
+@app.post("/predict", response_model=PredictionResponse)
+async def predict(req: PredictionRequest):
+    # Model inference is CPU-bound; keep it off the event loop
+    result = await run_in_threadpool(
+        predict_resistance,
         age=req.age,
         weight_kg=req.weight_kg,
         gender=req.gender,
-        admission_date=req.admission_date,
+        admission_date=req.admission_date.isoformat(),
         cancer_type=req.cancer_type,
         pathogen_id=req.pathogen_id,
         antibiotic_id=req.antibiotic_id,
         duration_days=req.duration_days,
         region=req.region,
     )
-    log_prediction(req.dict(), result)
+    log_prediction(req, result)
     return result
 
 
-@app.get("/dashboard-stats")
-def dashboard_stats():
-    try:
-        conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
-        cur = conn.cursor()
-
-        cur.execute("SELECT COUNT(*) FROM public.prediction_logs WHERE created_at >= NOW() - INTERVAL '7 days'")
-        checks_this_week = cur.fetchone()[0]
-
-        cur.execute("""
-            SELECT
-                SUM((result->>'resistant')::int),
-                SUM(CASE WHEN (result->>'resistant')::int = 0 THEN 1 ELSE 0 END)
-            FROM public.prediction_logs
+async def _query_dashboard_stats(conn) -> dict:
+    async with conn.cursor() as cur:
+        # One round trip: every aggregate the dashboard needs, computed by a single statement
+        await cur.execute("""
+            WITH weekly AS (
+                SELECT COUNT(*) AS checks
+                FROM public.prediction_logs
+                WHERE created_at >= NOW() - INTERVAL '7 days'
+            ),
+            totals AS (
+                SELECT
+                    SUM((result->>'resistant')::int) AS resistant,
+                    SUM(CASE WHEN (result->>'resistant')::int = 0 THEN 1 ELSE 0 END) AS sensitive,
+                    AVG(age) AS avg_age
+                FROM public.prediction_logs
+            ),
+            top_abx AS (
+                SELECT json_agg(json_build_object('name', name, 'count', cnt) ORDER BY cnt DESC) AS top_antibiotics
+                FROM (
+                    SELECT COALESCE(a.name, 'Antibiotic ' || p.antibiotic_id) AS name, COUNT(*) AS cnt
+                    FROM public.prediction_logs p
+                    LEFT JOIN public.antibiotics a USING (antibiotic_id)
+                    GROUP BY p.antibiotic_id, a.name
+                    ORDER BY 2 DESC
+                    LIMIT 5
+                ) t
+            )
+            SELECT weekly.checks, totals.resistant, totals.sensitive, top_abx.top_antibiotics, totals.avg_age
+            FROM weekly, totals, top_abx
         """)
-        resistant, sensitive = cur.fetchone()
-        resistant_count = resistant or 0
-        not_resistant_count = sensitive or 0
+        checks_this_week, resistant, sensitive, top_antibiotics, avg_age = await cur.fetchone()
 
-        cur.execute("SELECT antibiotic_id, COUNT(*) FROM public.prediction_logs GROUP BY antibiotic_id ORDER BY 2 DESC LIMIT 5")
-        top_rows = cur.fetchall()
-        names = {1:"Ceftriaxone",2:"Amoxicillin",3:"Levofloxacin",4:"Meropenem",5:"Vancomycin",
-                 6:"Piperacillin-Tazobactam",7:"Nitrofurantoin",8:"Ciprofloxacin"}
-        top_antibiotics = [{"name": names.get(i, f"Antibiotic {i}"), "count": c} for i, c in top_rows]
+    resistant_count = resistant or 0
+    not_resistant_count = sensitive or 0
+    top_antibiotics = top_antibiotics or []
+    avg_age = float(avg_age or 0)
 
-        cur.execute("SELECT AVG(age) FROM public.prediction_logs")
-        avg_age = float(cur.fetchone()[0] or 0)
+    return {
+        "checks_this_week": checks_this_week,
+        "resistant_count": resistant_count,
+        "not_resistant_count": not_resistant_count,
+        "top_antibiotics": top_antibiotics,
+        "average_age": round(avg_age, 1),
+    }
 
-        cur.close()
-        conn.close()
 
-        return {
-            "checks_this_week": checks_this_week,
-            "resistant_count": resistant_count,
-            "not_resistant_count": not_resistant_count,
-            "top_antibiotics": top_antibiotics,
-            "average_age": round(avg_age, 1),
-        }
-    except Exception as e:
-        logger.exception("Dashboard stats error")
-        return {"checks_this_week":0,"resistant_count":0,"not_resistant_count":0,"top_antibiotics":[],"average_age":0}
+@app.get("/dashboard-stats", response_model=DashboardStats)
+async def dashboard_stats():
+    # The lock makes concurrent misses wait for one recompute instead of all hitting the DB.
+    # Only that recompute takes a pooled connection: hits and waiters hold none.
+    async with _stats_lock:
+        stats = _stats_cache.get("stats")
+        if stats is None:
+            try:
+                # The pool context commits, or rolls back on error
+                async with db.pool.connection(timeout=db.POOL_TIMEOUT) as conn:
+                    stats = await _query_dashboard_stats(conn)
+            except Exception:
+                logger.exception("Dashboard stats error")
+                return {"checks_this_week":0,"resistant_count":0,"not_resistant_count":0,"top_antibiotics":[],"average_age":0}
+            _stats_cache["stats"] = stats
+    return stats
 
 
 # ============================
@@ -459,171 +528,144 @@ admin_router = APIRouter(prefix="/admin", tags=["admin"])
 
 
 # --- Hospitals ---
-@admin_router.get("/hospitals", response_model=List[dict])
-def list_hospitals(conn=Depends(get_db_conn)):
-    with conn.cursor() as cur:
-        cur.execute("SELECT hospital_id, name, region, status FROM public.hospitals ORDER BY hospital_id")
-        rows = cur.fetchall()
-    return [dict(zip(["id", "name", "region", "status"], r)) for r in rows]
-
-
-@admin_router.post("/hospitals", response_model=dict)
-def create_hospital(h: HospitalCreate, conn=Depends(get_db_conn)):
-    with conn.cursor() as cur:
-        cur.execute(
-            "INSERT INTO public.hospitals (name, region, status) VALUES (%s, %s, %s) RETURNING hospital_id, name, region, status",
+@admin_router.get("/hospitals", response_model=List[HospitalOut])
+async def list_hospitals(
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+):
+    async def load():
+        # Connection taken only on a miss: cache hits hold none, and a busy or unreachable
+        # DB surfaces here, inside get_or_load, which can still serve a stale page
+        async with db.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(PREPARED_STATEMENTS["list_hospitals"], (limit, offset), prepare=True)
+            return await cur.fetchall()
+
+    return await cache.get_or_load(cache.HOSPITALS_KEY, f"{limit}:{offset}", load)
+
+
+@admin_router.post("/hospitals", response_model=HospitalOut)
+async def create_hospital(h: HospitalCreate, conn=Depends(get_db_conn)):
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            "INSERT INTO public.hospitals (name, region, status) VALUES (%s, %s, %s) RETURNING hospital_id AS id, name, region, status",
             (h.name, h.region, h.status)
         )
-        row = cur.fetchone()
-    return dict(zip(["id", "name", "region", "status"], row))
+        row = await cur.fetchone()
+    await cache.invalidate_after_commit(conn, cache.HOSPITALS_KEY)
+    return row
 
 
-@admin_router.put("/hospitals/{hospital_id}", response_model=dict)
-def update_hospital(hospital_id: int, h: HospitalUpdate, conn=Depends(get_db_conn)):
-    updates, values = [], []
-    if h.name is not None: updates.append("name = %s"); values.append(h.name)
-    if h.region is not None: updates.append("region = %s"); values.append(h.region)
-    if h.status is not None: updates.append("status = %s"); values.append(h.status)
-    if not updates:
+@admin_router.put("/hospitals/{hospital_id}", response_model=HospitalOut)
+async def update_hospital(hospital_id: int, h: HospitalUpdate, conn=Depends(get_db_conn)):
+    if h.name is None and h.region is None and h.status is None:
         raise HTTPException(400, "No fields to update")
-    values.append(hospital_id)
-    query = f"UPDATE public.hospitals SET {', '.join(updates)}, updated_at = NOW() WHERE hospital_id = %s RETURNING hospital_id, name, region, status"
-    with conn.cursor() as cur:
-        cur.execute(query, values)
-        row = cur.fetchone()
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            PREPARED_STATEMENTS["hospital_update"],
+            (h.name, h.region, h.status, hospital_id),
+            prepare=True,
+        )
+        row = await cur.fetchone()
         if not row:
             raise HTTPException(404, "Hospital not found")
-    return dict(zip(["id", "name", "region", "status"], row))
+    await cache.invalidate_after_commit(conn, cache.HOSPITALS_KEY)
+    return row
 
 
-@admin_router.delete("/hospitals/{hospital_id}")
-def delete_hospital(hospital_id: int, conn=Depends(get_db_conn)):
-    with conn.cursor() as cur:
-        cur.execute(
+@admin_router.delete("/hospitals/{hospital_id}", response_model=DetailResponse)
+async def delete_hospital(hospital_id: int, conn=Depends(get_db_conn)):
+    async with conn.cursor() as cur:
+        await cur.execute(
             "DELETE FROM public.hospitals WHERE hospital_id = %s RETURNING hospital_id",
             (hospital_id,)
         )
-        row = cur.fetchone()
+        row = await cur.fetchone()
         if not row:
             raise HTTPException(404, "Hospital not found")
+    await cache.invalidate_after_commit(conn, cache.HOSPITALS_KEY)
     return {"detail": "Hospital deleted"}
 
 # --- Doctors ---
-@admin_router.get("/doctors", response_model=List[dict])
-def list_doctors(conn=Depends(get_db_conn)):
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT doctor_id, name, role, region, hospital, status
-            FROM medportal.doctors
-            ORDER BY doctor_id
-        """)
-        rows = cur.fetchall()
-
+@admin_router.get("/doctors", response_model=List[DoctorOut])
+async def list_doctors(
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    ids: Optional[List[str]] = Query(None, max_length=500),
+):
     # Return role exactly as stored in DB
-    return [
-        {
-            "id": r[0],
-            "name": r[1],
-            "role": r[2],  # <-- keep original capitalization
-            "region": r[3],
-            "hospital": r[4],
-            "status": r[5]
-        }
-        for r in rows
-    ]
+    if ids:
+        # Targeted lookup (?ids=..&ids=..): one query instead of one per row, not cached
+        async with db.connection() as conn:
+            return await doctor_queries.doctors_by_ids(conn, ids)
+
+    async def load():
+        async with db.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(PREPARED_STATEMENTS["list_doctors"], (limit, offset), prepare=True)
+            return await cur.fetchall()
 
+    return await cache.get_or_load(cache.DOCTORS_KEY, f"{limit}:{offset}", load)
 
-@admin_router.post("/doctors", response_model=dict)
-def create_doctor(d: DoctorCreate, conn=Depends(get_db_conn)):
-    pwd_hash = bcrypt.hashpw(d.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+@admin_router.post("/doctors", response_model=DoctorOut)
+async def create_doctor(d: DoctorCreate, conn=Depends(get_db_conn)):
+    pwd_hash = await bcrypt_pool.hash_async(d.password)
 
     # Normalize role before saving
     normalized_role = d.role.capitalize()
 
-    with conn.cursor() as cur:
-        cur.execute(
+    # Role is returned with DB capitalization
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
             """
             INSERT INTO medportal.doctors
             (doctor_id, name, role, region, hospital, status, password_hash)
             VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING doctor_id, name, role, region, hospital, status
+            RETURNING doctor_id AS id, name, role, region, hospital, status
             """,
             (d.doctor_id, d.name, normalized_role, d.region, d.hospital, d.status, pwd_hash)
         )
-        row = cur.fetchone()
-
-    return {
-        "id": row[0],
-        "name": row[1],
-        "role": row[2],  # <-- keep DB capitalization
-        "region": row[3],
-        "hospital": row[4],
-        "status": row[5],
-    }
-
-
-@admin_router.put("/doctors/{doctor_id}", response_model=dict)
-def update_doctor(doctor_id: str, d: DoctorUpdate, conn=Depends(get_db_conn)):
-    updates, values = [], []
+        row = await cur.fetchone()
+    await cache.invalidate_after_commit(conn, cache.DOCTORS_KEY)
+    return row
 
-    if d.name is not None:
-        updates.append("name = %s")
-        values.append(d.name)
 
-    if d.role is not None:
-        updates.append("role = %s")
-        values.append(d.role.capitalize())  # Save with proper capitalization
-
-    if d.region is not None:
-        updates.append("region = %s")
-        values.append(d.region)
-
-    if d.hospital is not None:
-        updates.append("hospital = %s")
-        values.append(d.hospital)
-
-    if d.status is not None:
-        updates.append("status = %s")
-        values.append(d.status)
-
-    if d.password is not None:
-        pwd_hash = bcrypt.hashpw(d.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-        updates.append("password_hash = %s")
-        values.append(pwd_hash)
-
-    if not updates:
+@admin_router.put("/doctors/{doctor_id}", response_model=DoctorOut)
+async def update_doctor(doctor_id: str, d: DoctorUpdate, conn=Depends(get_db_conn)):
+    fields = (d.name, d.role, d.region, d.hospital, d.status, d.password)
+    if all(v is None for v in fields):
         raise HTTPException(400, "No fields to update")
 
-    values.append(doctor_id)
-
-    query = f"""
-        UPDATE medportal.doctors
-        SET {', '.join(updates)}, updated_at = NOW()
-        WHERE doctor_id = %s
-        RETURNING doctor_id, name, role, region, hospital, status
-    """
+    role = d.role.capitalize() if d.role is not None else None  # Save with proper capitalization
+    pwd_hash = await bcrypt_pool.hash_async(d.password) if d.password is not None else None
 
-    with conn.cursor() as cur:
-        cur.execute(query, values)
-        row = cur.fetchone()
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            PREPARED_STATEMENTS["doctor_update"],
+            (d.name, role, d.region, d.hospital, d.status, pwd_hash, doctor_id),
+            prepare=True,
+        )
+        row = await cur.fetchone()
         if not row:
             raise HTTPException(404, "Doctor not found")
 
-    return {
-        "id": row[0],
-        "name": row[1],
-        "role": row[2],  # <-- return as-is
-        "region": row[3],
-        "hospital": row[4],
-        "status": row[5],
-    }
+    await cache.invalidate_after_commit(conn, cache.DOCTORS_KEY)
+    return row
+
+
+@admin_router.post("/doctors:bulk-update", response_model=List[DoctorOut])
+async def bulk_update_doctors(body: DoctorBulkUpdate, conn=Depends(get_db_conn)):
+    rows = await doctor_queries.bulk_update_doctors(conn, body.doctors, capitalize_role=True)
+    await cache.invalidate_after_commit(conn, cache.DOCTORS_KEY)
+    return rows
+
 
-@admin_router.delete("/doctors/{doctor_id}")
-def delete_doctor(doctor_id: str, conn=Depends(get_db_conn)):
-    with conn.cursor() as cur:
-        cur.execute("DELETE FROM medportal.doctors WHERE doctor_id = %s RETURNING doctor_id", (doctor_id,))
-        if not cur.fetchone():
+@admin_router.delete("/doctors/{doctor_id}", response_model=DetailResponse)
+async def delete_doctor(doctor_id: str, conn=Depends(get_db_conn)):
+    async with conn.cursor() as cur:
+        await cur.execute("DELETE FROM medportal.doctors WHERE doctor_id = %s RETURNING doctor_id", (doctor_id,))
+        if not await cur.fetchone():
             raise HTTPException(404, "Doctor not found")
+    await cache.invalidate_after_commit(conn, cache.DOCTORS_KEY)
     return {"detail": "Doctor deleted"}
 
 
@@ -1,17 +1,25 @@
 import os
+import time
+import atexit
+import queue
+import hashlib
 import logging
+import threading
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import Optional, Generator
 
-import bcrypt
 import jwt  # PyJWT
 import psycopg2
 from psycopg2 import pool
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 
+from src.bcrypt_pool import hash_password, verify_password, verify_dummy, needs_rehash
+
 # === Load env ===
 load_dotenv()
 
@@ -26,8 +34,11 @@ JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
-POOL_MINCONN = int(os.getenv("DB_POOL_MIN", "1"))
-POOL_MAXCONN = int(os.getenv("DB_POOL_MAX", "10"))
+# Same sizing rule as src/db.py: at most (cores * 2) + 1 connections per process
+POOL_CAP = (os.cpu_count() or 1) * 2 + 1
+POOL_MAXCONN = min(int(os.getenv("DB_POOL_MAX", str(POOL_CAP))), POOL_CAP)
+POOL_MINCONN = min(int(os.getenv("DB_POOL_MIN", "2")), POOL_MAXCONN)
+PGBOUNCER = os.getenv("DB_PGBOUNCER", "").lower() in ("1", "true", "yes")  # same switch as src/db.py
 
 REQUIRED = {
     "POSTGRES_DB": POSTGRES_DB,
@@ -43,20 +54,28 @@ if missing:
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("medportal-api")
 
-# === App ===
-app = FastAPI(title="MedPortal Auth API")
-
-# CORS — adjust the origins for your frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"],  # change as needed
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+# === DB pool (global) ===
+_db_pool: Optional[pool.ThreadedConnectionPool] = None
+
+# Parsed and planned once per pooled connection; login runs EXECUTE stmt_login(%s).
+# PgBouncer transaction pooling hands each transaction to any server backend, where the
+# statement may not exist: there, login sends the plain parameterized query instead.
+LOGIN_PREPARE = "PREPARE stmt_login (text) AS SELECT password_hash FROM medportal.doctors WHERE doctor_id = $1 LIMIT 1"
+LOGIN_LOOKUP = (
+    "SELECT password_hash FROM medportal.doctors WHERE doctor_id = %s LIMIT 1" if PGBOUNCER
+    else "EXECUTE stmt_login(%s)"
 )
 
-# === DB pool (global) ===
-_db_pool: Optional[pool.SimpleConnectionPool] = None
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """Connection that prepares the hot login lookup as soon as the pool opens it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self.cursor() as cur:
+            cur.execute(LOGIN_PREPARE)
+        self.commit()
+
 
 def get_db_conn() -> Generator:
     """
@@ -105,6 +124,11 @@ def create_refresh_token(subject: str, expires_delta: Optional[timedelta] = None
     token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return token
 
+def token_digest(token: str) -> bytes:
+    # Sessions store only SHA-256 of the refresh token, never the token itself
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
 def decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
@@ -115,43 +139,138 @@ def decode_token(token: str) -> dict:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
 
-# === Utility: write audit record ===
-def write_audit(conn, doctor_id: Optional[str], ip: str, user_agent: str, action: str, success: bool, reason: Optional[str] = None):
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO medportal.auth_audit (doctor_id, ip_address, user_agent, action, success, reason)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """,
-            (doctor_id, ip, user_agent, action, success, reason)
-        )
-        conn.commit()
+# === Utility: background audit writer ===
+# Audit rows have no read-after-write requirement: handlers only queue them and a
+# background thread inserts them in batches, so logins skip an INSERT + COMMIT each.
+AUDIT_BATCH_SIZE = 500  # rows per INSERT
+AUDIT_FLUSH_INTERVAL = 0.2  # seconds a partial batch may wait before it is written
+AUDIT_RETRY_DELAY = 0.2  # seconds between attempts while the DB pool has no free connection
+AUDIT_INSERT = "INSERT INTO medportal.auth_audit (doctor_id, ip_address, user_agent, action, success, reason) VALUES %s"
+
+_audit_queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+_audit_thread: Optional[threading.Thread] = None
+
+
+def write_audit(doctor_id: Optional[str], ip: str, user_agent: str, action: str, success: bool, reason: Optional[str] = None):
+    _audit_queue.put_nowait((doctor_id, ip, user_agent, action, success, reason))
+
+
+def _drain_audit() -> tuple:
+    """Block for one row, then take more until the batch is full or the interval ends.
+    Returns (rows, stop); stop is set once the None sentinel is reached."""
+    rows = []
+    item = _audit_queue.get()
+    deadline = time.monotonic() + AUDIT_FLUSH_INTERVAL
+    while item is not None:
+        rows.append(item)
+        remaining = deadline - time.monotonic()
+        if len(rows) >= AUDIT_BATCH_SIZE or remaining <= 0:
+            return rows, False
+        try:
+            item = _audit_queue.get(timeout=remaining)
+        except queue.Empty:
+            return rows, False
+    return rows, True
 
 
-# === App lifecycle events ===
-@app.on_event("startup")
+def _insert_audit_rows(rows: list):
+    conn = _db_pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            execute_values(cur, AUDIT_INSERT, rows, page_size=AUDIT_BATCH_SIZE)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        _db_pool.putconn(conn)
+
+
+def _audit_flusher():
+    # Never exits except on the sentinel: a dead writer would leave every later row queued forever
+    while True:
+        rows, stop = _drain_audit()
+        while rows:
+            try:
+                _insert_audit_rows(rows)
+                rows = None
+            except pool.PoolError:
+                # getconn() fails at once while request threads hold every connection: keep the batch
+                if _db_pool is None or _db_pool.closed:
+                    logger.error("DB pool closed; dropping %d audit rows", len(rows))
+                    rows = None
+                else:
+                    logger.warning("DB pool exhausted; retrying %d audit rows", len(rows))
+                    time.sleep(AUDIT_RETRY_DELAY)
+            except Exception:
+                logger.exception("Failed to write %d audit rows", len(rows))
+                rows = None
+        if stop:
+            return
+
+
+# === App lifecycle ===
 def startup():
-    global _db_pool
-    logger.info("Starting app and creating DB pool...")
-    _db_pool = psycopg2.pool.SimpleConnectionPool(
+    global _db_pool, _audit_thread
+    logger.info("Starting app and creating DB pool (%d-%d connections)...", POOL_MINCONN, POOL_MAXCONN)
+    _db_pool = psycopg2.pool.ThreadedConnectionPool(
         POOL_MINCONN,
         POOL_MAXCONN,
         host=POSTGRES_HOST,
         dbname=POSTGRES_DB,
         user=POSTGRES_USER,
         password=POSTGRES_PASSWORD,
-        port=POSTGRES_PORT
+        port=POSTGRES_PORT,
+        connection_factory=None if PGBOUNCER else PreparedConnection,
     )
     if not _db_pool:
         raise RuntimeError("Failed to create DB pool")
+    _audit_thread = threading.Thread(target=_audit_flusher, name="audit-writer", daemon=True)
+    _audit_thread.start()
 
 
-@app.on_event("shutdown")
 def shutdown():
+    global _audit_thread
+    if _audit_thread:
+        # Sentinel: the writer flushes everything queued before it, then exits
+        _audit_queue.put_nowait(None)
+        _audit_thread.join()
+        _audit_thread = None
+    _close_pool()
+
+
+def _close_pool():
     global _db_pool
     if _db_pool:
         logger.info("Closing DB pool...")
         _db_pool.closeall()
+        _db_pool = None
+
+
+# Backstop for exits that skip the lifespan teardown, so Postgres backends are not leaked
+atexit.register(_close_pool)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup()
+    try:
+        yield
+    finally:
+        shutdown()
+
+
+# === App ===
+app = FastAPI(title="MedPortal Auth API", lifespan=lifespan)
+
+# CORS — adjust the origins for your frontend
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:3000"],  # change as needed
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 
 # === Health endpoint ===
@@ -173,44 +292,47 @@ def login(request_data: LoginRequest, request: Request, conn=Depends(get_db_conn
     # Step 1: fetch user
     try:
         with conn.cursor() as cur:
-            cur.execute(
-                "SELECT password_hash FROM medportal.doctors WHERE doctor_id = %s LIMIT 1",
-                (request_data.doctor_id,)
-            )
+            cur.execute(LOGIN_LOOKUP, (request_data.doctor_id,))
             row = cur.fetchone()
     except Exception as e:
         logger.exception("DB error during login fetch")
         raise HTTPException(status_code=500, detail="Internal server error")
 
     if not row:
+        # Same hash cost as a real check: no ID enumeration by timing
+        verify_dummy(request_data.password)
         # record failed attempt with no doctor match
-        try:
-            write_audit(conn, request_data.doctor_id, client_ip, user_agent, "login_attempt", False, "doctor_not_found")
-        except Exception:
-            logger.exception("Failed to write audit (doctor_not_found)")
+        write_audit(request_data.doctor_id, client_ip, user_agent, "login_attempt", False, "doctor_not_found")
         raise HTTPException(status_code=401, detail="Invalid ID or password")
 
     stored_hash = row[0]
 
     # Step 2: verify password
     try:
-        password_matches = bcrypt.checkpw(request_data.password.encode(), stored_hash.encode())
+        password_matches = verify_password(request_data.password, stored_hash.encode())
     except Exception:
         logger.exception("bcrypt error")
         # write audit
-        try:
-            write_audit(conn, request_data.doctor_id, client_ip, user_agent, "login_attempt", False, "bcrypt_error")
-        except Exception:
-            logger.exception("Failed to write audit (bcrypt_error)")
+        write_audit(request_data.doctor_id, client_ip, user_agent, "login_attempt", False, "bcrypt_error")
         raise HTTPException(status_code=500, detail="Internal server error")
 
     if not password_matches:
         # wrong password
+        write_audit(request_data.doctor_id, client_ip, user_agent, "login_attempt", False, "wrong_password")
+        raise HTTPException(status_code=401, detail="Invalid ID or password")
+
+    if needs_rehash(stored_hash.encode()):
+        # Only now do we hold the plaintext, so this is where bcrypt -> argon2id migration happens
+        new_hash = hash_password(request_data.password)
         try:
-            write_audit(conn, request_data.doctor_id, client_ip, user_agent, "login_attempt", False, "wrong_password")
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE medportal.doctors SET password_hash = %s WHERE doctor_id = %s",
+                    (new_hash, request_data.doctor_id)
+                )
+                conn.commit()
         except Exception:
-            logger.exception("Failed to write audit (wrong_password)")
-        raise HTTPException(status_code=401, detail="Invalid ID or password")
+            logger.exception("Failed to upgrade password hash")
 
     # Step 3: success - create tokens, write audit, store refresh token
     access_token = create_access_token(request_data.doctor_id)
@@ -223,19 +345,16 @@ def login(request_data: LoginRequest, request: Request, conn=Depends(get_db_conn
         with conn.cursor() as cur:
             cur.execute(
                 """
-                INSERT INTO medportal.sessions (doctor_id, refresh_token, expires_at)
+                INSERT INTO medportal.sessions (doctor_id, refresh_token_hash, expires_at)
                 VALUES (%s, %s, %s)
                 """,
-                (request_data.doctor_id, refresh_token, refresh_expires_at)
+                (request_data.doctor_id, token_digest(refresh_token), refresh_expires_at)
             )
             conn.commit()
     except Exception:
         logger.exception("Failed to save refresh token")
         # continue — token still returned but we log the failure
-    try:
-        write_audit(conn, request_data.doctor_id, client_ip, user_agent, "login_success", True, None)
-    except Exception:
-        logger.exception("Failed to write audit (login_success)")
+    write_audit(request_data.doctor_id, client_ip, user_agent, "login_success", True, None)
 
     return {
         "access_token": access_token,
@@ -285,8 +404,8 @@ def refresh_token_endpoint(body: RefreshRequest, request: Request, conn=Depends(
     try:
         with conn.cursor() as cur:
             cur.execute(
-                "SELECT id, expires_at FROM medportal.sessions WHERE doctor_id = %s AND refresh_token = %s LIMIT 1",
-                (doctor_id, body.refresh_token)
+                "SELECT id, expires_at FROM medportal.sessions WHERE doctor_id = %s AND refresh_token_hash = %s LIMIT 1",
+                (doctor_id, token_digest(body.refresh_token))
             )
             row = cur.fetchone()
     except Exception:
@@ -294,12 +413,12 @@ def refresh_token_endpoint(body: RefreshRequest, request: Request, conn=Depends(
         raise HTTPException(status_code=500, detail="Internal server error")
 
     if not row:
-        write_audit(conn, doctor_id, client_ip, user_agent, "refresh_failure", False, "session_not_found")
+        write_audit(doctor_id, client_ip, user_agent, "refresh_failure", False, "session_not_found")
         raise HTTPException(status_code=401, detail="Refresh token not found")
 
     session_id, expires_at = row
     if expires_at and expires_at < datetime.utcnow():
-        write_audit(conn, doctor_id, client_ip, user_agent, "refresh_failure", False, "expired")
+        write_audit(doctor_id, client_ip, user_agent, "refresh_failure", False, "expired")
         raise HTTPException(status_code=401, detail="Refresh token expired")
 
     # create new tokens
@@ -311,14 +430,14 @@ def refresh_token_endpoint(body: RefreshRequest, request: Request, conn=Depends(
     try:
         with conn.cursor() as cur:
             cur.execute(
-                "UPDATE medportal.sessions SET refresh_token = %s, expires_at = %s WHERE id = %s",
-                (refresh_token_new, new_expires_at, session_id)
+                "UPDATE medportal.sessions SET refresh_token_hash = %s, expires_at = %s WHERE id = %s",
+                (token_digest(refresh_token_new), new_expires_at, session_id)
             )
             conn.commit()
     except Exception:
         logger.exception("Failed to rotate refresh token")
 
-    write_audit(conn, doctor_id, client_ip, user_agent, "refresh_success", True, None)
+    write_audit(doctor_id, client_ip, user_agent, "refresh_success", True, None)
 
     return {
         "access_token": access_token,
@@ -0,0 +1,132 @@
+# src/bcrypt_pool.py
+"""
+Dedicated worker pool for password hashing, shared by src.api and src.admin_api.
+New hashes are argon2id (OWASP parameters); legacy bcrypt hashes still verify and are
+flagged by needs_rehash so login upgrades them. Both libraries release the GIL while
+hashing, so a thread pool uses every core. Submission is bounded: once BCRYPT_MAX_PENDING
+jobs are in flight, callers get 503 + Retry-After instead of queueing behind a login
+flood, so other endpoints keep their latency. (Module, env and metric names predate
+argon2 and are kept so existing config and dashboards keep working.)
+"""
+import os
+import time
+import asyncio
+import concurrent.futures
+from typing import Optional
+
+import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge, Histogram
+
+
+# === Config ===
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_KIB = int(os.getenv("ARGON2_MEMORY_KIB", "8192"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str((os.cpu_count() or 1) * 2)))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "500"))
+
+
+# === Metrics ===
+QUEUE_LENGTH = Gauge("bcrypt_queue_length", "bcrypt jobs submitted and not yet finished")
+DURATION_MS = Histogram(
+    "bcrypt_processing_duration_ms",
+    "Time one bcrypt hash or verify spends on a worker thread, in milliseconds",
+    buckets=(25, 50, 100, 200, 300, 500, 1000, 2500),
+)
+REJECTED = Counter("bcrypt_rejected_total", "bcrypt jobs refused with 503 because the pool was full")
+
+
+_hasher = PasswordHasher(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_KIB, parallelism=ARGON2_PARALLELISM)
+# Verified against when the doctor_id does not exist, so that branch costs the same as a real check
+_DUMMY_HASH = _hasher.hash("medportal-dummy-password").encode("utf-8")
+
+
+# === Pool ===
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def start():
+    global _executor, _slots
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+        _slots = asyncio.Semaphore(BCRYPT_MAX_PENDING)
+
+
+def shutdown():
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+        _slots = None
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        DURATION_MS.observe((time.perf_counter() - started) * 1000)
+
+
+async def _submit(fn, *args):
+    if _slots.locked():
+        REJECTED.inc()
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+    async with _slots:
+        QUEUE_LENGTH.inc()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_executor, _timed, fn, *args)
+        finally:
+            QUEUE_LENGTH.dec()
+
+
+# === Sync primitives (also used directly by src.api_login) ===
+def _is_bcrypt(stored_hash: bytes) -> bool:
+    return stored_hash.startswith(b"$2")
+
+
+def hash_password(password: str) -> str:
+    return _hasher.hash(password)
+
+
+def verify_password(password: str, stored_hash: bytes) -> bool:
+    """Raises ValueError for a malformed stored hash."""
+    if _is_bcrypt(stored_hash):
+        return bcrypt.checkpw(password.encode("utf-8"), stored_hash)
+    try:
+        return _hasher.verify(stored_hash.decode("utf-8"), password)
+    except VerificationError:
+        return False
+
+
+def verify_dummy(password: str) -> bool:
+    """Equalize timing and CPU for unknown accounts; always False."""
+    verify_password(password, _DUMMY_HASH)
+    return False
+
+
+def needs_rehash(stored_hash: bytes) -> bool:
+    # Legacy bcrypt always migrates; argon2 hashes encode their parameters, so retuning also upgrades
+    if _is_bcrypt(stored_hash):
+        return True
+    try:
+        return _hasher.check_needs_rehash(stored_hash.decode("utf-8"))
+    except ValueError:
+        return False
+
+
+# === Public helpers ===
+async def hash_async(password: str) -> str:
+    return await _submit(hash_password, password)
+
+
+async def verify_async(password: str, stored_hash: bytes) -> bool:
+    return await _submit(verify_password, password, stored_hash)
+
+
+async def verify_dummy_async(password: str) -> bool:
+    return await _submit(verify_dummy, password)
@@ -0,0 +1,149 @@
+# src/cache.py
+"""
+Optional Redis cache for admin list responses, shared by src.api and src.admin_api.
+Enabled only when REDIS_URL is set (and the redis package is installed); otherwise every
+call falls straight through to the loader, whose rows are still encoded in one pass.
+Each resource is one Redis hash ("admin:doctors") holding, per page, the JSON body plus
+written/stale-at timestamps, so a single DEL on write invalidates every page. Every
+invalidation also bumps the resource's generation counter ("admin:doctors:gen"); a page
+is only stored if the generation has not moved since before its loader ran, so a read
+that raced a write cannot put the old rows back after the DEL. If the loader fails and
+a stale body is still held, that is served.
+Responses are returned as pre-encoded JSON bytes: no per-row response-model objects are
+built, and on a miss the body sent to the client is the same bytes that go to Redis.
+"""
+import os
+import json
+import time
+import logging
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Response
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # optional dependency
+    redis = None
+
+logger = logging.getLogger("medportal-cache")
+
+
+# === Config ===
+REDIS_URL = os.getenv("REDIS_URL")
+LIST_CACHE_TTL = float(os.getenv("ADMIN_LIST_CACHE_TTL", "5"))  # seconds a cached page is served as fresh
+STALE_KEEP = 3600  # seconds a page is kept around as a fallback for a failing loader
+
+HOSPITALS_KEY = "admin:hospitals"
+DOCTORS_KEY = "admin:doctors"
+
+
+# === Client ===
+client: Optional["redis.Redis"] = None
+
+
+async def open_client():
+    global client
+    if client is None and REDIS_URL:
+        if redis is None:
+            logger.warning("REDIS_URL is set but the redis package is not installed; admin list cache disabled")
+            return
+        client = redis.from_url(REDIS_URL)
+        logger.info("Admin list cache enabled (ttl=%ss)", LIST_CACHE_TTL)
+
+
+async def close_client():
+    global client
+    if client is not None:
+        await client.aclose()
+        client = None
+
+
+# === Helpers ===
+def _encode(rows: list) -> bytes:
+    # Compact UTF-8, byte-identical to what the response models would produce for these rows
+    return json.dumps(rows, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _generation_key(key: str) -> str:
+    # Outlives the hash it guards: DEL on the hash leaves the counter in place
+    return f"{key}:gen"
+
+
+def _json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+
+async def get_or_load(
+    key: str, page: str, loader: Callable[[], Awaitable[list]], ttl: float = LIST_CACHE_TTL
+) -> Response:
+    """Return the cached body for `page` of `key`, or run `loader` and cache its rows.
+    Rows must already have the response model's shape, since the model is bypassed."""
+    if client is None:
+        return _json_response(_encode(await loader()))
+
+    stale = None
+    cacheable = True
+    gen_key = _generation_key(key)
+    try:
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.hmget(key, f"body:{page}", f"stale_at:{page}")
+            pipe.get(gen_key)
+            (body, stale_at), generation = await pipe.execute()
+        if body is not None:
+            if float(stale_at) > time.time():
+                return _json_response(body)
+            stale = body
+    except redis.RedisError:
+        logger.exception("Cache read failed for %s", key)
+        cacheable = False  # generation unknown: cannot tell whether these rows are current
+
+    try:
+        rows = await loader()
+    except Exception:
+        if stale is None:
+            raise
+        logger.exception("Loader failed for %s; serving stale cache", key)
+        return _json_response(stale)
+
+    body = _encode(rows)
+    if not cacheable:
+        return _json_response(body)
+    now = time.time()
+    try:
+        async with client.pipeline(transaction=True) as pipe:
+            # WATCH + re-check: skip the write if an invalidation landed since the read above
+            await pipe.watch(gen_key)
+            if await pipe.get(gen_key) == generation:
+                pipe.multi()
+                pipe.hset(key, mapping={
+                    f"body:{page}": body,
+                    f"ts:{page}": now,
+                    f"stale_at:{page}": now + ttl,
+                })
+                pipe.expire(key, STALE_KEEP)
+                await pipe.execute()
+    except redis.WatchError:
+        pass  # invalidated while writing: the next miss loads fresh rows
+    except redis.RedisError:
+        logger.exception("Cache write failed for %s", key)
+    return _json_response(body)
+
+
+async def invalidate_after_commit(conn, *keys: str):
+    """Commit first, so a miss that starts after the invalidation reads the new rows;
+    a miss whose loader read before the commit is kept out by the generation bump."""
+    await conn.commit()
+    await invalidate(*keys)
+
+
+async def invalidate(*keys: str):
+    if client is None:
+        return
+    try:
+        async with client.pipeline(transaction=True) as pipe:
+            for key in keys:
+                pipe.incr(_generation_key(key))
+            pipe.delete(*keys)
+            await pipe.execute()
+    except redis.RedisError:
+        logger.exception("Cache invalidation failed for %s", keys)
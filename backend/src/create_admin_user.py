@@ -16,6 +16,9 @@ DB_USER = os.getenv("POSTGRES_USER")
 DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
 DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
+# Seed accounts are written as legacy bcrypt at this cost; the API hashes with argon2id and
+# needs_rehash upgrades these to argon2id on their first login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "9"))
 
 ADMIN_ID = "333333"
 ADMIN_PASSWORD = "123321"
@@ -31,7 +34,7 @@ def main():
         print("Missing POSTGRES_DB, POSTGRES_USER, or POSTGRES_PASSWORD in .env")
         sys.exit(1)
 
-    password_hash = bcrypt.hashpw(ADMIN_PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    password_hash = bcrypt.hashpw(ADMIN_PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("utf-8")
 
     try:
         conn = psycopg2.connect(
@@ -1,7 +1,12 @@
 import os
-import random
+import sys
+import base64
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
 import bcrypt
 import psycopg2
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 import getpass
 
@@ -13,24 +18,51 @@ DB_USER = os.getenv("POSTGRES_USER")
 DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
 DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
+# Seed accounts are written as legacy bcrypt at this cost; the API hashes with argon2id and
+# needs_rehash upgrades these to argon2id on their first login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "9"))
 
 
-def generate_unique_doctor_id(cursor):
-    """Generate a 6-digit doctor ID that doesn't already exist."""
-    while True:
-        doctor_id = str(random.randint(100000, 999999))
-        cursor.execute(
-            "SELECT 1 FROM medportal.doctors WHERE doctor_id = %s LIMIT 1;",
-            (doctor_id,)
-        )
-        if cursor.fetchone() is None:
-            return doctor_id
+def generate_doctor_ids(cursor, count: int) -> List[str]:
+    """Draw `count` unused 6-digit doctor IDs from medportal.doctor_id_seq in one round trip."""
+    cursor.execute("SELECT medportal.next_doctor_id() FROM generate_series(1, %s);", (count,))
+    return [row[0] for row in cursor.fetchall()]
 
 
-def create_doctor(password: str):
-    """Creates a new doctor profile with random 6-digit ID and hashed password."""
+# Standard base64 alphabet -> bcrypt's ("./A-Za-z0-9"); the bit packing is the same
+_BCRYPT_B64 = bytes.maketrans(
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/",
+    b"./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789",
+)
+BCRYPT_SALT_BYTES = 16
+
+
+def bcrypt_salts(count: int) -> List[bytes]:
+    """`count` bcrypt salts ("$2b$<rounds>$" + 22 chars) cut from one os.urandom read,
+    instead of a gensalt() call, each with its own urandom read, per password."""
+    raw = os.urandom(BCRYPT_SALT_BYTES * count)
+    prefix = b"$2b$%02d$" % BCRYPT_ROUNDS
+    return [
+        prefix + base64.b64encode(raw[i:i + BCRYPT_SALT_BYTES]).translate(_BCRYPT_B64)[:22]
+        for i in range(0, len(raw), BCRYPT_SALT_BYTES)
+    ]
+
+
+def hash_password(password: str, salt: bytes) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
 
-    password_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+def create_doctors(passwords: List[str]):
+    """Creates one doctor profile per password: one connection, one batched INSERT, one commit."""
+
+    salts = bcrypt_salts(len(passwords))
+    if len(passwords) == 1:
+        # Interactive single account: not worth forking worker processes for one hash
+        password_hashes = [hash_password(passwords[0], salts[0])]
+    else:
+        # Hashing dominates for large batches; spread it over the cores, no more workers than passwords
+        with ProcessPoolExecutor(max_workers=min(len(passwords), os.cpu_count() or 1)) as pool:
+            password_hashes = list(pool.map(hash_password, passwords, salts, chunksize=16))
 
     try:
         conn = psycopg2.connect(
@@ -42,26 +74,27 @@ def create_doctor(password: str):
         )
         cursor = conn.cursor()
 
-        doctor_id = generate_unique_doctor_id(cursor)
+        doctor_ids = generate_doctor_ids(cursor, len(passwords))
 
-        cursor.execute(
-            "INSERT INTO medportal.doctors (doctor_id, password_hash) VALUES (%s, %s) RETURNING id;",
-            (doctor_id, password_hash)
+        created = execute_values(
+            cursor,
+            "INSERT INTO medportal.doctors (doctor_id, password_hash) VALUES %s RETURNING doctor_id, id;",
+            list(zip(doctor_ids, password_hashes)),
+            page_size=500,
+            fetch=True,
         )
-        doctor_pk = cursor.fetchone()[0]
 
         conn.commit()
 
-        print("Doctor profile created!")
-        print(f"Doctor ID: {doctor_id}")
-        print(f"Password: {password}")
-        print(f"Primary key: {doctor_pk}")
+        print(f"{len(created)} doctor profile(s) created!")
+        for doctor_id, doctor_pk in created:
+            print(f"Doctor ID: {doctor_id}  Primary key: {doctor_pk}")
 
-        return doctor_id, doctor_pk
+        return created
 
     except Exception as e:
-        print("Error creating doctor:", e)
-        return None, None
+        print("Error creating doctors:", e)
+        return []
 
     finally:
         if 'cursor' in locals():
@@ -70,6 +103,19 @@ def create_doctor(password: str):
             conn.close()
 
 
+def create_doctor(password: str):
+    """Creates a new doctor profile with a sequence-assigned 6-digit ID and hashed password."""
+    created = create_doctors([password])
+    if not created:
+        return None, None
+    print(f"Password: {password}")
+    return created[0]
+
+
 if __name__ == "__main__":
-    password = getpass.getpass("Enter doctor password: ")
-    create_doctor(password)
+    if sys.stdin.isatty():
+        password = getpass.getpass("Enter doctor password: ")
+        create_doctor(password)
+    else:
+        # Bulk onboarding: one password per line, e.g. python -m src.create_doctor < passwords.txt
+        create_doctors([line.strip() for line in sys.stdin if line.strip()])
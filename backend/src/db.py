@@ -0,0 +1,127 @@
+# src/db.py
+"""
+Shared PostgreSQL connection pool for the MedPortal apps (src.api and src.admin_api).
+Both apps import the pool and the get_db_conn dependency from here, so one process
+holds a single pool no matter how many apps it serves.
+
+Behind PgBouncer (pool_mode=transaction), point POSTGRES_HOST/POSTGRES_PORT at PgBouncer,
+set DB_PGBOUNCER=1 and keep DB_POOL_MAX small (3-5 per worker); size PgBouncer's
+default_pool_size to (Postgres cores * 2) + 1. Transaction pooling hands each transaction
+to any server backend, so server-side prepared statements are switched off in that mode.
+"""
+import os
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional, AsyncGenerator
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from psycopg import AsyncConnection
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+load_dotenv()
+
+
+# === Config / env validation ===
+DB_NAME = os.getenv("POSTGRES_DB")
+DB_USER = os.getenv("POSTGRES_USER")
+DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
+DB_PORT = os.getenv("POSTGRES_PORT", "5432")
+# Per-process cap of (cores * 2) + 1; across workers, pool max * workers must stay under
+# ~80% of Postgres max_connections
+POOL_CAP = (os.cpu_count() or 1) * 2 + 1
+POOL_MAXCONN = min(int(os.getenv("DB_POOL_MAX", str(POOL_CAP))), POOL_CAP)
+POOL_MINCONN = min(int(os.getenv("DB_POOL_MIN", "2")), POOL_MAXCONN)
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # seconds to wait for a free connection
+POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))  # close connections idle this long (above min_size)
+POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))  # recycle connections after this many seconds
+PGBOUNCER = os.getenv("DB_PGBOUNCER", "").lower() in ("1", "true", "yes")
+
+if not all([DB_NAME, DB_USER, DB_PASSWORD]):
+    raise RuntimeError("Missing required DB environment variables: POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD")
+
+logger = logging.getLogger("medportal-db")
+
+
+# === Pool ===
+pool: Optional[AsyncConnectionPool] = None
+
+
+async def _warm_connection(conn: AsyncConnection):
+    """Pool `configure` hook: round-trip once so a new connection is usable before it is handed out."""
+    await conn.execute("SELECT 1")
+    await conn.commit()
+
+
+async def open_pool() -> AsyncConnectionPool:
+    global pool
+    if pool is None:
+        pool = AsyncConnectionPool(
+            min_size=POOL_MINCONN,
+            max_size=POOL_MAXCONN,
+            kwargs=dict(
+                host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, port=DB_PORT,
+                # None disables prepared statements, including execute(prepare=True)
+                prepare_threshold=None if PGBOUNCER else 5,
+            ),
+            configure=_warm_connection,
+            max_idle=POOL_MAX_IDLE,
+            max_lifetime=POOL_MAX_LIFETIME,
+            open=False,
+        )
+        # Block startup until min_size connections are connected and warmed
+        await pool.open(wait=True)
+        logger.info("Database pool ready (%d-%d connections)", POOL_MINCONN, POOL_MAXCONN)
+    return pool
+
+
+async def close_pool():
+    global pool
+    if pool is not None:
+        logger.info("Closing database pool...")
+        await pool.close()
+        pool = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_pool()
+    try:
+        yield
+    finally:
+        await close_pool()
+
+
+@asynccontextmanager
+async def connection() -> AsyncGenerator[AsyncConnection, None]:
+    """One pooled connection for a block of work, taken only when the block runs (unlike
+    get_db_conn, which holds one for the whole request). Commits on success, rolls back on
+    error; 503 if no connection frees up within POOL_TIMEOUT."""
+    if pool is None:
+        raise RuntimeError("DB pool not initialized")
+    try:
+        async with pool.connection(timeout=POOL_TIMEOUT) as conn:
+            yield conn
+    except PoolTimeout:
+        raise HTTPException(status_code=503, detail="Database busy, try again")
+
+
+# === Dependency ===
+async def get_db_conn() -> AsyncGenerator[AsyncConnection, None]:
+    """Reusable DB dependency with auto commit/rollback"""
+    if pool is None:
+        raise RuntimeError("DB pool not initialized")
+    try:
+        conn = await pool.getconn(timeout=POOL_TIMEOUT)
+    except PoolTimeout:
+        # Bounded wait; shed load instead of piling up requests
+        raise HTTPException(status_code=503, detail="Database busy, try again")
+    try:
+        yield conn
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+    finally:
+        await pool.putconn(conn)
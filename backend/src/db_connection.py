@@ -12,6 +12,9 @@ DB_NAME = os.getenv("POSTGRES_DB", "atlas_db")  # Connect to atlas_db
 DB_USER = os.getenv("POSTGRES_USER", "postgres")
 DB_PASS = os.getenv("POSTGRES_PASSWORD", "")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
+# Seed accounts are written as legacy bcrypt at this cost; the API hashes with argon2id and
+# needs_rehash upgrades these to argon2id on their first login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "9"))
 
 try:
     conn = psycopg2.connect(
@@ -30,7 +33,7 @@ except Exception as e:
 # Generate a random 6-digit doctor ID
 doctor_id = str(random.randint(100000, 999999))
 password = input("Enter password for doctor: ").strip()
-password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 # Ensure schema exists
 cursor.execute("CREATE SCHEMA IF NOT EXISTS medportal")
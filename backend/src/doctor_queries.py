@@ -0,0 +1,57 @@
+# src/doctor_queries.py
+"""
+Batched doctor reads/writes behind the admin routers of both src.api and src.admin_api:
+one round trip for N doctors, each column travelling as one array parameter.
+"""
+from typing import List
+
+from fastapi import HTTPException
+from psycopg.rows import dict_row
+
+from src.schemas import DoctorBulkUpdateItem
+
+
+DOCTORS_BY_IDS = (
+    "SELECT doctor_id AS id, name, role, region, hospital, status FROM medportal.doctors "
+    "WHERE doctor_id = ANY(%s) ORDER BY doctor_id"
+)
+# A NULL in any column array keeps that doctor's current value
+DOCTOR_BULK_UPDATE = (
+    "UPDATE medportal.doctors AS d SET name = COALESCE(v.name, d.name), role = COALESCE(v.role, d.role), "
+    "region = COALESCE(v.region, d.region), hospital = COALESCE(v.hospital, d.hospital), "
+    "status = COALESCE(v.status, d.status), updated_at = NOW() "
+    "FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[], %s::text[], %s::text[]) "
+    "AS v(doctor_id, name, role, region, hospital, status) "
+    "WHERE d.doctor_id = v.doctor_id "
+    "RETURNING d.doctor_id AS id, d.name, d.role, d.region, d.hospital, d.status"
+)
+
+
+async def doctors_by_ids(conn, ids: List[str]) -> list:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(DOCTORS_BY_IDS, (ids,), prepare=True)
+        return await cur.fetchall()
+
+
+async def bulk_update_doctors(conn, doctors: List[DoctorBulkUpdateItem], capitalize_role: bool = False) -> list:
+    """Apply every partial update in one statement and return the updated rows.
+    Unknown IDs are simply absent from the result; the caller commits."""
+    ids = [d.doctor_id for d in doctors]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Duplicate doctor_id in batch")
+
+    roles = [d.role.capitalize() if capitalize_role and d.role is not None else d.role for d in doctors]
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            DOCTOR_BULK_UPDATE,
+            (
+                ids,
+                [d.name for d in doctors],
+                roles,
+                [d.region for d in doctors],
+                [d.hospital for d in doctors],
+                [d.status for d in doctors],
+            ),
+            prepare=True,
+        )
+        return await cur.fetchall()
@@ -0,0 +1,93 @@
+"""
+Idempotent schema migrations (indexes and other DDL the API relies on for speed).
+Usage: from backend folder run: python -m src.migrate_db
+Or: cd src && python migrate_db.py
+Safe to re-run: every statement is guarded with IF [NOT] EXISTS.
+"""
+import os
+import sys
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_NAME = os.getenv("POSTGRES_DB")
+DB_USER = os.getenv("POSTGRES_USER")
+DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
+DB_PORT = os.getenv("POSTGRES_PORT", "5432")
+
+MIGRATIONS = [
+    # /dashboard-stats: weekly checks filter on created_at
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pl_created_at ON public.prediction_logs (created_at DESC)",
+    # /dashboard-stats: top antibiotics group by antibiotic_id (index-only scan)
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pl_antibiotic ON public.prediction_logs (antibiotic_id)",
+    # Sessions keep sha256(refresh_token) instead of the JWT: backfill, index, then drop the wide column
+    "ALTER TABLE medportal.sessions ADD COLUMN IF NOT EXISTS refresh_token_hash BYTEA",
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = 'medportal' AND table_name = 'sessions' AND column_name = 'refresh_token') THEN
+            UPDATE medportal.sessions SET refresh_token_hash = sha256(convert_to(refresh_token, 'UTF8'))
+            WHERE refresh_token_hash IS NULL AND refresh_token IS NOT NULL;
+        END IF;
+    END $$
+    """,
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sessions_refresh_hash ON medportal.sessions USING HASH (refresh_token_hash)",
+    "ALTER TABLE medportal.sessions DROP COLUMN IF EXISTS refresh_token",
+    # /login reads password_hash and role by doctor_id: covering index makes it an index-only scan
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_doctors_login ON medportal.doctors (doctor_id) INCLUDE (password_hash, role)",
+    # Doctor IDs come from a sequence; next_doctor_id() skips IDs already handed out at random
+    "CREATE SEQUENCE IF NOT EXISTS medportal.doctor_id_seq MINVALUE 100000 MAXVALUE 999999",
+    """
+    CREATE OR REPLACE FUNCTION medportal.next_doctor_id() RETURNS text
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        candidate text;
+    BEGIN
+        LOOP
+            candidate := lpad(nextval('medportal.doctor_id_seq')::text, 6, '0');
+            EXIT WHEN NOT EXISTS (SELECT 1 FROM medportal.doctors WHERE doctor_id = candidate);
+        END LOOP;
+        RETURN candidate;
+    END $$
+    """,
+]
+
+
+def main():
+    if not all([DB_NAME, DB_USER, DB_PASSWORD]):
+        print("Missing POSTGRES_DB, POSTGRES_USER, or POSTGRES_PASSWORD in .env")
+        sys.exit(1)
+
+    try:
+        conn = psycopg2.connect(
+            dbname=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT,
+        )
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = True
+        cur = conn.cursor()
+
+        for statement in MIGRATIONS:
+            print(f"Applying: {statement}")
+            cur.execute(statement)
+
+        print("Migrations applied successfully.")
+
+    except Exception as e:
+        print("Error:", e)
+        sys.exit(1)
+    finally:
+        if "cur" in dir():
+            cur.close()
+        if "conn" in dir():
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,22 @@
 # src/predict.py
 import os
-import pandas as pd
+import json
+import math
+import ctypes
+import threading
+from datetime import datetime
+
 import numpy as np
-from catboost import CatBoostClassifier, Pool
+from catboost import CatBoostClassifier
 from dotenv import load_dotenv
 
 load_dotenv()
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "training_final_v9_ultra.cbm")
+# Frequency/target-encoding maps and interaction top sets saved by train_model.py with the model
+ENCODERS_PATH = os.path.join(os.path.dirname(__file__), "training_final_v9_ultra.encoders.json")
+# Optional path to CatBoost's standalone C evaluator (libcatboostmodel.so / .dll from the CatBoost
+# release assets, same version as training). When set, single rows skip the Python bindings.
+CATBOOST_MODEL_LIB = os.getenv("CATBOOST_MODEL_LIB")
 
 # Load CatBoost model
 model = CatBoostClassifier()
@@ -19,20 +29,21 @@ MEDIANS = {
     "weight_kg": 70.0,
     "duration_days": 7.0,
     "weight_age_ratio": 70.0 / 51.0,
-    "duration_log": float(np.log1p(7.0)),
+    "duration_log": math.log1p(7.0),
     "weight_duration": 70.0 * 7.0,
     "age_duration": 50.0 * 7.0,
     "age_sq": 50.0 ** 2,
     "weight_sq": 70.0 ** 2,
     "duration_sq": 7.0 ** 2,
-    "weight_log": float(np.log1p(70.0)),
-    "age_log": float(np.log1p(50.0)),
+    "weight_log": math.log1p(70.0),
+    "age_log": math.log1p(50.0),
     "admission_year": 0,
     "admission_month": 0,
     "season": 0
 }
 
-# Safe defaults for frequency and target-encoding features (you can replace with real values from training)
+# Fallbacks for frequency and target-encoding features: used for every row when no encoders
+# file is present, and for categories training never saw when it is
 FREQ_DEFAULT = 0.0        # values were normalized by max (0..1) during training
 TE_DEFAULT = 0.5          # fallback target-encoding mean (class prior-ish)
 
@@ -44,18 +55,51 @@ def _map_interaction(val: str, top_set: set) -> str:
     # If you populate top_set with top values from training, this will map unseen -> 'other'
     return val if val in top_set else "other"
 
-def month_to_season(m: int) -> int:
-    if m in (12, 1, 2): return 0
-    if m in (3, 4, 5): return 1
-    if m in (6, 7, 8): return 2
-    if m in (9, 10, 11): return 3
-    return -1
+def _age_bin(age: float) -> str:
+    # Same buckets as pd.cut(bins=[0, 20, 40, 60, 80, 120]) in training (right-inclusive; 0 falls in "0")
+    if age <= 20: return "0"
+    if age <= 40: return "1"
+    if age <= 60: return "2"
+    if age <= 80: return "3"
+    return "4"
+
+def _log1p(x: float) -> float:
+    # Scalar math.log1p (no ufunc dispatch); -inf/NaN below the domain like np.log1p instead of raising
+    if x > -1:
+        return math.log1p(x)
+    return -math.inf if x == -1 else math.nan
+
+def _parse_admission(admission_date: str):
+    # -> (year, month); (0, 0) for anything unparseable, like pd.to_datetime(errors="coerce") -> NaT
+    try:
+        ad = datetime.fromisoformat(admission_date)
+    except (TypeError, ValueError):
+        return 0, 0
+    return ad.year, ad.month
+
+# Season by month, as in training (index 0 = unparseable date): winter 0, spring 1, summer 2, autumn 3
+SEASON_LUT = (-1, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0)
 
 # Top interactions (empty sets here; ideally fill with training top values to preserve interaction buckets)
 TOP_REGION_PATHOGEN = set()
 TOP_REGION_ANTIBIOTIC = set()
 TOP_ANTIBIOTIC_CANCER = set()
 
+def _load_encoders(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"No encoders file at {path}; frequency/target-encoding features use constant fallbacks")
+        return None
+
+ENCODERS = _load_encoders(ENCODERS_PATH)
+if ENCODERS is not None:
+    TE_DEFAULT = ENCODERS["te_global_mean"]
+    TOP_REGION_PATHOGEN = set(ENCODERS["top"]["region_pathogen"])
+    TOP_REGION_ANTIBIOTIC = set(ENCODERS["top"]["region_antibiotic"])
+    TOP_ANTIBIOTIC_CANCER = set(ENCODERS["top"]["antibiotic_cancer"])
+
 # Feature order exactly like training (34 features)
 FEATURE_ORDER = [
     "age",
@@ -100,6 +144,129 @@ FEATURE_ORDER = [
     "age_bin"
 ]
 
+# Categorical columns (same as training cat_features_for_cb); everything else is numeric
+CAT_FEATURES = [
+    "gender", "cancer_type", "region",
+    "region_pathogen", "region_antibiotic", "antibiotic_cancer",
+    "age_bin", "season"
+]
+NUMERIC_FEATURES = [f for f in FEATURE_ORDER if f not in CAT_FEATURES]
+NUMERIC_IDX = {name: i for i, name in enumerate(NUMERIC_FEATURES)}
+FEATURE_IDX = {name: i for i, name in enumerate(FEATURE_ORDER)}
+
+# Where each group lands in the FEATURE_ORDER row handed to the model. The model indexes its
+# float and categorical features in this same relative order (categoricals: season first).
+_NUM_POS = [FEATURE_IDX[f] for f in NUMERIC_FEATURES]
+_CAT_POS = sorted(FEATURE_IDX[f] for f in CAT_FEATURES)
+_CAT_ORDER = [FEATURE_ORDER[i] for i in _CAT_POS]
+
+# (position in cat_values, freq slot, te slot, freq map, te map) per encoded categorical
+ENCODED_FEATURES = ["gender", "cancer_type", "region", "region_pathogen", "region_antibiotic", "antibiotic_cancer"]
+_ENCODED = [
+    (_CAT_ORDER.index(col), NUMERIC_IDX[f"{col}_freq"], NUMERIC_IDX[f"{col}_target_enc"],
+     ENCODERS["freq"][col], ENCODERS["te"][col])
+    for col in ENCODED_FEATURES
+] if ENCODERS is not None else []
+
+def _numeric_default(col: str) -> float:
+    if col in MEDIANS:
+        return MEDIANS[col]
+    if col.endswith("_freq"):
+        return FREQ_DEFAULT
+    if col.endswith("_target_enc"):
+        return TE_DEFAULT
+    return 0.0
+
+# Starting numeric row (freq/te features keep these values) and the fallback for any numeric NaN
+_NUM_DEFAULTS = np.array([_numeric_default(f) for f in NUMERIC_FEATURES], dtype=np.float32)
+
+# Per-thread buffers, overwritten in place on every call (predict runs on the threadpool)
+_TLS = threading.local()
+
+def _buffers():
+    bufs = getattr(_TLS, "bufs", None)
+    if bufs is None:
+        # object row: numeric and string features side by side, the mixed input CatBoost accepts
+        bufs = _TLS.bufs = (np.empty(len(NUMERIC_FEATURES), dtype=np.float32),
+                            np.empty((1, len(FEATURE_ORDER)), dtype=object))
+    return bufs
+
+def _sigmoid(x: float) -> float:
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    e = math.exp(x)
+    return e / (1.0 + e)
+
+class _CEvaluator:
+    """Scores one row through the CatBoost C API (c_api.h): float features as a float32
+    buffer, categorical features as UTF-8 strings, both in the model's own order."""
+
+    def __init__(self, lib_path: str, model_path: str):
+        lib = ctypes.CDLL(lib_path)
+        lib.ModelCalcerCreate.restype = ctypes.c_void_p
+        lib.GetErrorString.restype = ctypes.c_char_p
+        lib.LoadFullModelFromFile.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+        lib.LoadFullModelFromFile.restype = ctypes.c_bool
+        lib.GetFloatFeaturesCount.argtypes = [ctypes.c_void_p]
+        lib.GetFloatFeaturesCount.restype = ctypes.c_size_t
+        lib.GetCatFeaturesCount.argtypes = [ctypes.c_void_p]
+        lib.GetCatFeaturesCount.restype = ctypes.c_size_t
+        lib.CalcModelPredictionSingle.argtypes = [
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.c_float), ctypes.c_size_t,
+            ctypes.POINTER(ctypes.c_char_p), ctypes.c_size_t,
+            ctypes.POINTER(ctypes.c_double), ctypes.c_size_t,
+        ]
+        lib.CalcModelPredictionSingle.restype = ctypes.c_bool
+        self._lib = lib
+
+        self._handle = lib.ModelCalcerCreate()
+        if not lib.LoadFullModelFromFile(self._handle, model_path.encode()):
+            raise RuntimeError(f"CatBoost C evaluator failed to load {model_path}: {lib.GetErrorString().decode()}")
+        counts = (lib.GetFloatFeaturesCount(self._handle), lib.GetCatFeaturesCount(self._handle))
+        if counts != (len(NUMERIC_FEATURES), len(CAT_FEATURES)):
+            raise RuntimeError(f"Model has {counts} float/categorical features, predict.py builds "
+                               f"{(len(NUMERIC_FEATURES), len(CAT_FEATURES))}")
+
+    def probability(self, num: np.ndarray, cat_values: list) -> float:
+        cats = (ctypes.c_char_p * len(cat_values))(*(v.encode("utf-8") for v in cat_values))
+        raw = ctypes.c_double()
+        ok = self._lib.CalcModelPredictionSingle(
+            self._handle,
+            num.ctypes.data_as(ctypes.POINTER(ctypes.c_float)), len(num),
+            cats, len(cat_values),
+            ctypes.byref(raw), 1,
+        )
+        if not ok:
+            raise RuntimeError(f"CatBoost C evaluator failed: {self._lib.GetErrorString().decode()}")
+        # Binary Logloss model: one raw value, probability of class 1 is its sigmoid
+        return _sigmoid(raw.value)
+
+_evaluator = _CEvaluator(CATBOOST_MODEL_LIB, MODEL_PATH) if CATBOOST_MODEL_LIB else None
+if _evaluator is not None:
+    print("Using CatBoost C evaluator:", CATBOOST_MODEL_LIB)
+
+def _admission_features(admission_date):
+    # -> (year, month, season); season is categorical: "0" with no date, "-1" for an unparseable one
+    if admission_date is None:
+        return 0, 0, 0
+    admission_year, admission_month = _parse_admission(admission_date)
+    return admission_year, admission_month, SEASON_LUT[admission_month]
+
+def _cat_values(season, gender, cancer_type, region, pathogen_id, antibiotic_id, age) -> list:
+    # Categorical features in FEATURE_ORDER (= the model's categorical order);
+    # interactions map unseen -> "other" using TOP_* sets
+    return [
+        str(season),
+        str(gender),
+        str(cancer_type),
+        str(region),
+        _map_interaction(f"{region}_{pathogen_id}", TOP_REGION_PATHOGEN),
+        _map_interaction(f"{region}_{antibiotic_id}", TOP_REGION_ANTIBIOTIC),
+        _map_interaction(f"{antibiotic_id}_{cancer_type}", TOP_ANTIBIOTIC_CANCER),
+        _age_bin(age),
+    ]
+
 def predict_resistance(age, weight_kg, gender, cancer_type,
                        pathogen_id, antibiotic_id, duration_days, region,
                        admission_date=None):
@@ -108,129 +275,109 @@ def predict_resistance(age, weight_kg, gender, cancer_type,
     weight_kg = float(weight_kg)
     duration_days = float(duration_days)
 
-    # Admission features
-    if admission_date is None:
-        admission_year, admission_month, season = 0, 0, 0
+    admission_year, admission_month, season = _admission_features(admission_date)
+
+    # Numeric features, written straight into their slots; freq/te start from their defaults
+    num, row = _buffers()
+    num[:] = _NUM_DEFAULTS
+    num[NUMERIC_IDX["age"]] = age
+    num[NUMERIC_IDX["weight_kg"]] = weight_kg
+    num[NUMERIC_IDX["duration_days"]] = duration_days
+    num[NUMERIC_IDX["admission_year"]] = admission_year
+    num[NUMERIC_IDX["admission_month"]] = admission_month
+
+    # Engineered numeric features (as in training)
+    num[NUMERIC_IDX["weight_age_ratio"]] = weight_kg / (age + 1)
+    num[NUMERIC_IDX["duration_log"]] = _log1p(duration_days)
+    num[NUMERIC_IDX["weight_log"]] = _log1p(weight_kg)
+    num[NUMERIC_IDX["age_log"]] = _log1p(age)
+    num[NUMERIC_IDX["weight_sq"]] = weight_kg ** 2
+    num[NUMERIC_IDX["age_sq"]] = age ** 2
+    num[NUMERIC_IDX["duration_sq"]] = duration_days ** 2
+    num[NUMERIC_IDX["age_duration"]] = age * duration_days
+    num[NUMERIC_IDX["weight_duration"]] = weight_kg * duration_days
+
+    cat_values = _cat_values(season, gender, cancer_type, region, pathogen_id, antibiotic_id, age)
+
+    # Frequency/target encodings from the training maps
+    for cat_i, freq_i, te_i, freq_map, te_map in _ENCODED:
+        value = cat_values[cat_i]
+        num[freq_i] = freq_map.get(value, FREQ_DEFAULT)
+        num[te_i] = te_map.get(value, TE_DEFAULT)
+
+    # Fill numeric NaNs with MEDIANS (0.0 for anything without one)
+    missing = np.isnan(num)
+    if missing.any():
+        num[missing] = _NUM_DEFAULTS[missing]
+
+    # One tree traversal: the class is derived from the probability (model.predict's threshold)
+    if _evaluator is not None:
+        prob = _evaluator.probability(num, cat_values)
     else:
-        ad = pd.to_datetime(admission_date, errors="coerce")
-        admission_year = int(ad.year) if not pd.isna(ad) else 0
-        admission_month = int(ad.month) if not pd.isna(ad) else 0
-        season = month_to_season(admission_month)
+        row[0, _NUM_POS] = num
+        row[0, _CAT_POS] = cat_values
+        # A single row is not worth spinning up CatBoost's worker threads
+        prob = float(model.predict(row, prediction_type="Probability", thread_count=1)[0][1])
+    pred = int(prob > 0.5)
+
+    return {"resistant": pred, "probability": prob}
 
-    # Interaction features (map unseen -> "other" using TOP_* sets)
-    region_pathogen = _map_interaction(f"{region}_{pathogen_id}", TOP_REGION_PATHOGEN)
-    region_antibiotic = _map_interaction(f"{region}_{antibiotic_id}", TOP_REGION_ANTIBIOTIC)
-    antibiotic_cancer = _map_interaction(f"{antibiotic_id}_{cancer_type}", TOP_ANTIBIOTIC_CANCER)
+def predict_resistance_batch(records: list) -> list:
+    """Score many rows with one model call. Each record is a dict with predict_resistance's
+    arguments (admission_date optional); results come back in the same order, with the same
+    features and probabilities predict_resistance gives for each row on its own."""
+    n = len(records)
+    if n == 0:
+        return []
+
+    def column(key, cast=float):
+        return np.fromiter((cast(r[key]) for r in records), dtype=np.float64, count=n)
+
+    age = column("age", lambda v: _clamp_age_for_bins(float(v)))
+    weight_kg = column("weight_kg")
+    duration_days = column("duration_days")
+    admission = [_admission_features(r.get("admission_date")) for r in records]
+
+    # Numeric features column by column; freq/te start from their defaults
+    num = np.tile(_NUM_DEFAULTS, (n, 1))
+    num[:, NUMERIC_IDX["age"]] = age
+    num[:, NUMERIC_IDX["weight_kg"]] = weight_kg
+    num[:, NUMERIC_IDX["duration_days"]] = duration_days
+    num[:, NUMERIC_IDX["admission_year"]] = [a[0] for a in admission]
+    num[:, NUMERIC_IDX["admission_month"]] = [a[1] for a in admission]
 
     # Engineered numeric features (as in training)
-    weight_age_ratio = weight_kg / (age + 1)
-    duration_log = float(np.log1p(duration_days))
-    weight_duration = weight_kg * duration_days
-    age_duration = age * duration_days
-    age_bin_val = pd.cut([age], bins=[0,20,40,60,80,120], labels=False)[0]
-    age_bin = str(int(age_bin_val)) if not pd.isna(age_bin_val) else "0"
-    age_sq = age ** 2
-    weight_sq = weight_kg ** 2
-    duration_sq = duration_days ** 2
-    weight_log = float(np.log1p(weight_kg))
-    age_log = float(np.log1p(age))
-
-    # Frequency features fallback (if you have training counts/vc, replace these defaults)
-    gender_freq = FREQ_DEFAULT
-    cancer_type_freq = FREQ_DEFAULT
-    region_freq = FREQ_DEFAULT
-    region_pathogen_freq = FREQ_DEFAULT
-    region_antibiotic_freq = FREQ_DEFAULT
-    antibiotic_cancer_freq = FREQ_DEFAULT
-
-    # Target-encoding fallbacks (if you have training maps, replace these defaults)
-    gender_target_enc = TE_DEFAULT
-    cancer_type_target_enc = TE_DEFAULT
-    region_target_enc = TE_DEFAULT
-    region_pathogen_target_enc = TE_DEFAULT
-    region_antibiotic_target_enc = TE_DEFAULT
-    antibiotic_cancer_target_enc = TE_DEFAULT
-
-    # Build single-row DataFrame containing ALL required features
-    row = {
-        "age": age,
-        "weight_kg": weight_kg,
-        "duration_days": duration_days,
-
-        "admission_year": admission_year,
-        "admission_month": admission_month,
-        "season": season,
-
-        "gender": str(gender),
-        "cancer_type": str(cancer_type),
-        "region": str(region),
-
-        "region_pathogen": region_pathogen,
-        "region_antibiotic": region_antibiotic,
-        "antibiotic_cancer": antibiotic_cancer,
-
-        "gender_freq": gender_freq,
-        "cancer_type_freq": cancer_type_freq,
-        "region_freq": region_freq,
-        "region_pathogen_freq": region_pathogen_freq,
-        "region_antibiotic_freq": region_antibiotic_freq,
-        "antibiotic_cancer_freq": antibiotic_cancer_freq,
-
-        "gender_target_enc": gender_target_enc,
-        "cancer_type_target_enc": cancer_type_target_enc,
-        "region_target_enc": region_target_enc,
-        "region_pathogen_target_enc": region_pathogen_target_enc,
-        "region_antibiotic_target_enc": region_antibiotic_target_enc,
-        "antibiotic_cancer_target_enc": antibiotic_cancer_target_enc,
-
-        "weight_age_ratio": weight_age_ratio,
-        "duration_log": duration_log,
-        "weight_log": weight_log,
-        "age_log": age_log,
-        "weight_sq": weight_sq,
-        "age_sq": age_sq,
-        "duration_sq": duration_sq,
-        "age_duration": age_duration,
-        "weight_duration": weight_duration,
-        "age_bin": age_bin
-    }
-
-    df = pd.DataFrame([row])
-
-    # Categorical columns (same as training cat_features_for_cb)
-    cat_cols = [
-        "gender", "cancer_type", "region",
-        "region_pathogen", "region_antibiotic", "antibiotic_cancer",
-        "age_bin", "season"
+    num[:, NUMERIC_IDX["weight_age_ratio"]] = weight_kg / (age + 1)
+    num[:, NUMERIC_IDX["duration_log"]] = np.log1p(duration_days)
+    num[:, NUMERIC_IDX["weight_log"]] = np.log1p(weight_kg)
+    num[:, NUMERIC_IDX["age_log"]] = np.log1p(age)
+    num[:, NUMERIC_IDX["weight_sq"]] = weight_kg * weight_kg
+    num[:, NUMERIC_IDX["age_sq"]] = age * age
+    num[:, NUMERIC_IDX["duration_sq"]] = duration_days * duration_days
+    num[:, NUMERIC_IDX["age_duration"]] = age * duration_days
+    num[:, NUMERIC_IDX["weight_duration"]] = weight_kg * duration_days
+
+    cats = [
+        _cat_values(a[2], r["gender"], r["cancer_type"], r["region"],
+                    r["pathogen_id"], r["antibiotic_id"], age_i)
+        for r, a, age_i in zip(records, admission, age.tolist())
     ]
-    for col in cat_cols:
-        df[col] = df[col].astype(str)
-
-    # Fill numeric NaNs with MEDIANS; frequency/te fallbacks already set
-    for col in df.columns:
-        if pd.isna(df.at[0, col]):
-            if col in MEDIANS:
-                df.at[0, col] = MEDIANS[col]
-            else:
-                # For freq/te and any other missing feature, keep the safe defaults:
-                if col.endswith("_freq"):
-                    df.at[0, col] = FREQ_DEFAULT
-                elif col.endswith("_target_enc"):
-                    df.at[0, col] = TE_DEFAULT
-                else:
-                    df.at[0, col] = 0.0
-
-    # Reorder columns to match training exactly
-    df = df[FEATURE_ORDER]
-
-    pool = Pool(df, cat_features=cat_cols)
-    pred = int(model.predict(pool)[0])
-    try:
-        prob = float(model.predict_proba(pool)[0][1])
-    except Exception:
-        prob = 0.0 if pred == 0 else 1.0
 
-    return {"resistant": pred, "probability": prob}
+    # Frequency/target encodings from the training maps
+    for cat_i, freq_i, te_i, freq_map, te_map in _ENCODED:
+        values = [c[cat_i] for c in cats]
+        num[:, freq_i] = [freq_map.get(v, FREQ_DEFAULT) for v in values]
+        num[:, te_i] = [te_map.get(v, TE_DEFAULT) for v in values]
+
+    # Fill numeric NaNs with MEDIANS (0.0 for anything without one)
+    num = np.where(np.isnan(num), _NUM_DEFAULTS, num)
+
+    rows = np.empty((n, len(FEATURE_ORDER)), dtype=object)
+    rows[:, _NUM_POS] = num
+    rows[:, _CAT_POS] = cats
+    probs = model.predict(rows, prediction_type="Probability")[:, 1]
+
+    return [{"resistant": int(prob > 0.5), "probability": prob} for prob in probs.tolist()]
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+# src/schemas.py
+"""Pydantic request/response models shared by src.api and src.admin_api."""
+from datetime import date, datetime
+from typing import Optional, List, Annotated
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+# Request bodies are validated once and never mutated; unknown keys are rejected
+REQUEST_MODEL_CONFIG = ConfigDict(extra="forbid", frozen=True)
+
+# Doctor IDs are six digits everywhere: what admin can create, login must accept
+DoctorId = Annotated[str, Field(min_length=6, max_length=6, pattern=r"^\d{6}$")]
+
+
+# === Public API ===
+class LoginRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    doctor_id: DoctorId
+    password: str = Field(..., min_length=1)
+
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: int
+    refresh_token: Optional[str] = None
+    role: Optional[str] = None
+
+
+class ValidateResponse(BaseModel):
+    valid: bool
+    doctor_id: Optional[str] = None
+    expires_at: Optional[datetime] = None
+
+
+class RefreshRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    refresh_token: str
+
+
+class PredictionRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    age: int
+    weight_kg: float
+    gender: str
+    admission_date: date  # ISO yyyy-mm-dd; a bad date is a 422 here, not a failed log write later
+    cancer_type: str
+    pathogen_id: int
+    antibiotic_id: int
+    duration_days: int
+    region: str
+
+
+class PredictionResponse(BaseModel):
+    resistant: int
+    probability: float
+
+
+class TopAntibiotic(BaseModel):
+    name: str
+    count: int
+
+
+class DashboardStats(BaseModel):
+    checks_this_week: int
+    resistant_count: int
+    not_resistant_count: int
+    top_antibiotics: List[TopAntibiotic]
+    average_age: float
+
+
+# === Admin API ===
+class DoctorCreate(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    name: str
+    doctor_id: DoctorId
+    password: str
+    role: str = "Doctor"
+    region: str
+    hospital: str
+    status: str = "Active"
+
+
+class DoctorUpdate(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    name: Optional[str] = None
+    role: Optional[str] = None
+    region: Optional[str] = None
+    hospital: Optional[str] = None
+    status: Optional[str] = None
+    password: Optional[str] = None
+
+
+class DoctorBulkUpdateItem(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    doctor_id: DoctorId
+    name: Optional[str] = None
+    role: Optional[str] = None
+    region: Optional[str] = None
+    hospital: Optional[str] = None
+    status: Optional[str] = None
+
+
+class DoctorBulkUpdate(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    # No passwords here: each one would cost a full hash on the worker pool
+    doctors: List[DoctorBulkUpdateItem] = Field(min_length=1, max_length=500)
+
+
+class HospitalCreate(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    name: str
+    region: str
+    status: str = "Active"
+
+
+class HospitalUpdate(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    name: Optional[str] = None
+    region: Optional[str] = None
+    status: Optional[str] = None
+
+
+class HospitalOut(BaseModel):
+    id: int
+    name: str
+    region: Optional[str] = None
+    status: Optional[str] = None
+
+
+class DoctorOut(BaseModel):
+    # Rows created by the CLI scripts may only have doctor_id and password_hash set
+    id: str
+    name: Optional[str] = None
+    role: Optional[str] = None
+    region: Optional[str] = None
+    hospital: Optional[str] = None
+    status: Optional[str] = None
+
+
+class DetailResponse(BaseModel):
+    detail: str
@@ -1,12 +1,17 @@
 # src/setup_db.py
 import os
+import io
+import csv
+import multiprocessing
+from collections import deque
 import psycopg2
+from psycopg2 import sql
 from psycopg2.extras import execute_values
 import random
-import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 from faker import Faker
 import numpy as np
+from numba import njit
 from dotenv import load_dotenv
 
 faker = Faker()
@@ -28,6 +33,7 @@ BATCH_SIZE = 20_000
 START_DATE = datetime(2020, 1, 1)
 RESISTANT_BOOST = 0.38  # high probability for boosted resistance
 TARGET_TREATMENTS = 4_000_000  # total treatments to generate
+GEN_WORKERS = os.cpu_count() or 1  # processes generating treatment batches
 
 # US top 7 states by population as regions
 US_REGIONS = ["California", "Texas", "Florida", "New York", "Pennsylvania", "Illinois", "Ohio"]
@@ -50,6 +56,18 @@ conn = psycopg2.connect(
 )
 cursor = conn.cursor()
 
+def csv_payload(rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue()
+
+def copy_csv(table, columns, payload):
+    # COPY ... FROM STDIN: one CSV stream per batch instead of INSERT statements
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT CSV)", io.StringIO(payload))
+
+def copy_rows(table, columns, rows):
+    copy_csv(table, columns, csv_payload(rows))
+
 # -------------------- WIPE EXISTING DATA --------------------
 print("Wiping existing hospitals, patients, and treatments...")
 cursor.execute("TRUNCATE TABLE treatments CASCADE;")
@@ -88,100 +106,238 @@ conn.commit()
 cursor.execute("SELECT antibiotic_id, name FROM antibiotics")
 antibiotic_list = cursor.fetchall()
 
+# -------------------- BULK LOAD SETTINGS --------------------
+# Patients and treatments load in a single transaction committed at the end, without the WAL
+# flush on commit. Their secondary indexes and foreign keys are dropped for the load and rebuilt
+# afterwards: one index build per index instead of per-row maintenance, one FK validation pass.
+cursor.execute("SET synchronous_commit = off")
+cursor.execute("SET maintenance_work_mem = '2GB'")
+
+LOAD_TABLES = ("patients", "treatments")
+cursor.execute("""
+    SELECT pg_get_indexdef(i.indexrelid), i.indexrelid::regclass::text
+    FROM pg_index i
+    WHERE i.indrelid = ANY(%s::regclass[])
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conrelid = i.indrelid AND c.conindid = i.indexrelid)
+""", (list(LOAD_TABLES),))
+load_indexes = cursor.fetchall()  # PK/unique constraint indexes stay: they are not droppable on their own
+cursor.execute("""
+    SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+    FROM pg_constraint
+    WHERE contype = 'f' AND conrelid = ANY(%s::regclass[])
+""", (list(LOAD_TABLES),))
+load_fkeys = cursor.fetchall()
+
+for table, name, _ in load_fkeys:
+    cursor.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(sql.SQL(table), sql.Identifier(name)))
+for _, index in load_indexes:
+    cursor.execute(sql.SQL("DROP INDEX {}").format(sql.SQL(index)))
+print(f"Dropped {len(load_indexes)} indexes and {len(load_fkeys)} foreign keys for the load")
+
 # -------------------- GENERATE NEW PATIENTS --------------------
 print("Generating new patients...")
+PATIENT_COLUMNS = ("patient_id", "age", "weight_kg", "gender", "cancer_type", "hospital_id", "region", "ssn")
+GENDERS = np.array(["Male", "Female"], dtype=object)
+CANCER_TYPE_ARR = np.array(CANCER_TYPES, dtype=object)
+hospital_id_arr = np.array(hospital_ids)
+hospital_region_arr = np.array([hospital_map[h] for h in hospital_ids], dtype=object)
+
+# Unique, well-formed SSNs (area 001-899 except 666, group 01-99, serial 0001-9999) drawn as
+# integers once, instead of a faker.ssn() provider call per patient
+SSN_GROUPS, SSN_SERIALS = 99, 9999
+ssn_codes = np.random.default_rng(42).choice(898 * SSN_GROUPS * SSN_SERIALS, NEW_PATIENTS, replace=False)
+
+def format_ssns(codes):
+    area, rest = np.divmod(codes, SSN_GROUPS * SSN_SERIALS)
+    group, serial = np.divmod(rest, SSN_SERIALS)
+    area += 1
+    area[area >= 666] += 1
+    return [f"{a:03d}-{g + 1:02d}-{s + 1:04d}" for a, g, s in zip(area.tolist(), group.tolist(), serial.tolist())]
+
+# Positions of the 32 hex digits in the canonical 8-4-4-4-12 form (the rest are hyphens)
+UUID_HEX_POS = [i for i in range(36) if i not in (8, 13, 18, 23)]
+
+def random_uuid4(n):
+    # Version-4 UUIDs in the canonical form str(uuid.uuid4()) gives, from the seeded RNG
+    raw = np.random.randint(0, 256, (n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    chars = np.full((n, 36), b"-", dtype="S1")
+    chars[:, UUID_HEX_POS] = np.frombuffer(raw.tobytes().hex().encode("ascii"), dtype="S1").reshape(n, 32)
+    return chars.view("S36").ravel().astype("U36").tolist()
+
 for start in range(0, NEW_PATIENTS, BATCH_SIZE):
-    batch = []
-    for _ in range(min(BATCH_SIZE, NEW_PATIENTS - start)):
-        patient_id = str(uuid.uuid4())
-        age = random.randint(18, 90)
-        weight = round(random.uniform(45, 120), 1)
-        gender = random.choice(["Male", "Female"])
-        cancer = random.choice(CANCER_TYPES)
-        hospital_id = random.choice(hospital_ids)
-        region = hospital_map[hospital_id]
-        ssn = faker.ssn()
-        batch.append((patient_id, age, weight, gender, cancer, hospital_id, region, ssn))
-    execute_values(cursor,
-                   """INSERT INTO patients (patient_id, age, weight_kg, gender, cancer_type, hospital_id, region, ssn)
-                      VALUES %s""",
-                   batch)
-    conn.commit()
-    print(f"Inserted patients: {start + len(batch)}/{NEW_PATIENTS}")
+    n = min(BATCH_SIZE, NEW_PATIENTS - start)
+    hosp_ix = np.random.randint(0, len(hospital_ids), n)
+    copy_rows("patients", PATIENT_COLUMNS, zip(
+        random_uuid4(n),
+        np.random.randint(18, 91, n).tolist(),
+        np.round(np.random.uniform(45, 120, n), 1).tolist(),
+        GENDERS[np.random.randint(0, len(GENDERS), n)].tolist(),
+        CANCER_TYPE_ARR[np.random.randint(0, len(CANCER_TYPE_ARR), n)].tolist(),
+        hospital_id_arr[hosp_ix].tolist(),
+        hospital_region_arr[hosp_ix].tolist(),
+        format_ssns(ssn_codes[start:start + n]),
+    ))
+    print(f"Inserted patients: {start + n}/{NEW_PATIENTS}")
 
 # -------------------- HELPER FUNCTIONS --------------------
-def simulate_lab_values(cancer_type):
-    wbc = np.random.normal(5.0, 4.0) if cancer_type in ["Leukemia", "Lymphoma"] else np.random.normal(7.0, 3.0)
+# Compiled with numba: these run once per treatment (millions of times), and scalar
+# np.random calls are cheap inside a jitted function. Names are resolved to flags up front.
+@njit(cache=True)
+def _seed_jit_rng(seed):
+    # numba keeps its own RNG state, separate from np.random.seed above
+    np.random.seed(seed)
+
+@njit(cache=True)
+def simulate_lab_values(is_blood_cancer):
+    wbc = np.random.normal(5.0, 4.0) if is_blood_cancer else np.random.normal(7.0, 3.0)
     wbc = max(0.1, min(40.0, wbc))
     neutrophils_pct = max(5.0, min(95.0, np.random.normal(60.0, 15.0)))
     crp = abs(np.random.normal(20.0, 25.0))
-    return round(wbc,2), round(neutrophils_pct,1), round(crp,1)
+    return round(wbc, 2), round(neutrophils_pct, 1), round(crp, 1)
 
-def compute_resistance(pathogen_name, antibiotic_name, neutrophils_pct, prev_abx_count):
+@njit(cache=True)
+def compute_resistance(is_hard_pathogen, is_meropenem, neutrophils_pct, prev_abx_count):
     base = 0.2
-    if "Acinetobacter" in pathogen_name or "Pseudomonas" in pathogen_name: base = 0.3
-    if "Meropenem" in antibiotic_name: base *= 0.6
+    if is_hard_pathogen: base = 0.3
+    if is_meropenem: base *= 0.6
     if neutrophils_pct < 20: base += 0.15
     base += min(0.15, 0.03 * prev_abx_count)
     base += np.random.normal(0, 0.03)
     base = max(0.01, min(0.99, base))
     return int(np.random.rand() < base), round(base, 4)
 
+@njit(cache=True)
+def simulate_treatments(is_blood_cancer, is_hard_pathogen, is_meropenem, prev_abx):
+    # Lab values and resistance for a whole batch in one compiled loop
+    n = len(prev_abx)
+    wbc = np.empty(n)
+    neutrophils_pct = np.empty(n)
+    crp = np.empty(n)
+    resistant = np.empty(n, dtype=np.int64)
+    prob = np.empty(n)
+    for i in range(n):
+        wbc[i], neutrophils_pct[i], crp[i] = simulate_lab_values(is_blood_cancer[i])
+        resistant[i], prob[i] = compute_resistance(is_hard_pathogen[i], is_meropenem[i],
+                                                   neutrophils_pct[i], prev_abx[i])
+    return wbc, neutrophils_pct, crp, resistant, prob
+
+_seed_jit_rng(42)
+BLOOD_CANCERS = {"Leukemia", "Lymphoma"}
+hard_pathogen_ids = {pid for pid, name in pathogen_list if "Acinetobacter" in name or "Pseudomonas" in name}
+meropenem_ids = {aid for aid, name in antibiotic_list if "Meropenem" in name}
+
 # -------------------- GENERATE TREATMENTS --------------------
 print("Generating treatments...")
-treatment_counter = 0
+TREATMENT_COLUMNS = ("patient_id", "antibiotic_id", "pathogen_id", "dose_mg", "duration_days",
+                     "previous_antibiotics_count", "wbc", "neutrophils_pct", "crp_mg_l", "resistant",
+                     "resistant_prob", "hospital_stay_days", "admission_date")
 
 cursor.execute("SELECT patient_id, cancer_type FROM patients")
 all_patients = cursor.fetchall()
-treatments = []
-
-while treatment_counter < TARGET_TREATMENTS:
-    for patient_id, cancer_type in all_patients:
-        if treatment_counter >= TARGET_TREATMENTS:
-            break
-        num_treatments = random.randint(1, 3)
-        for _ in range(num_treatments):
-            if treatment_counter >= TARGET_TREATMENTS:
-                break
-            antibiotic_id, antibiotic_name = random.choice(antibiotic_list)
-            pathogen_id, pathogen_name = random.choice(pathogen_list)
-            dose = int(round([b for a,b in ANTIBIOTICS if a==antibiotic_name][0] * random.uniform(0.8,1.2)))
-            duration = random.choice([3,5,7,10,14])
-            prev_abx = np.random.poisson(0.4)
-            wbc, neutrophils_pct, crp = simulate_lab_values(cancer_type)
-            resistant, prob = compute_resistance(pathogen_name, antibiotic_name, neutrophils_pct, prev_abx)
-
-            if random.random() < RESISTANT_BOOST:
-                resistant = 1
-                prob = max(prob, 0.8)
-                stay = int(max(1, np.random.normal(14,5))) + random.randint(7,15)
-            else:
-                stay = int(max(1, np.random.normal(7,3))) + (random.randint(7,25) if resistant else random.randint(0,5))
-
-            admission_date = START_DATE + timedelta(days=random.randint(0,(datetime.now()-START_DATE).days))
-            treatments.append((patient_id, antibiotic_id, pathogen_id, dose, duration, prev_abx,
-                               wbc, neutrophils_pct, crp, resistant, prob, stay, admission_date))
-            treatment_counter += 1
-
-            if treatment_counter % BATCH_SIZE == 0:
-                execute_values(cursor,
-                    """INSERT INTO treatments (patient_id, antibiotic_id, pathogen_id, dose_mg, duration_days,
-                       previous_antibiotics_count, wbc, neutrophils_pct, crp_mg_l, resistant, resistant_prob,
-                       hospital_stay_days, admission_date) VALUES %s""",
-                    treatments)
-                conn.commit()
-                print(f"Inserted treatments: {treatment_counter}/{TARGET_TREATMENTS}")
-                treatments = []
-
-# Insert any remaining
-if treatments:
-    execute_values(cursor,
-        """INSERT INTO treatments (patient_id, antibiotic_id, pathogen_id, dose_mg, duration_days,
-           previous_antibiotics_count, wbc, neutrophils_pct, crp_mg_l, resistant, resistant_prob,
-           hospital_stay_days, admission_date) VALUES %s""",
-        treatments)
-    conn.commit()
+patient_ids = np.array([row[0] for row in all_patients], dtype=object)
+patient_blood_cancer = np.array([row[1] in BLOOD_CANCERS for row in all_patients])
+del all_patients
+
+# Lookup arrays aligned with the DB rows, so one index draw resolves id, dose and flags
+dose_by_name = dict(ANTIBIOTICS)
+antibiotic_ids = np.array([row[0] for row in antibiotic_list])
+antibiotic_doses = np.array([dose_by_name[row[1]] for row in antibiotic_list])
+antibiotic_meropenem = np.array([row[0] in meropenem_ids for row in antibiotic_list])
+pathogen_ids = np.array([row[0] for row in pathogen_list])
+pathogen_hard = np.array([row[0] in hard_pathogen_ids for row in pathogen_list])
+DURATIONS = np.array([3, 5, 7, 10, 14])
+start_day = np.datetime64(START_DATE.date(), "D")
+days_span = (datetime.now() - START_DATE).days
+
+# Walk the patients in order, 1-3 treatments each, cycling until TARGET_TREATMENTS rows
+treatment_patients = []
+planned = 0
+while planned < TARGET_TREATMENTS:
+    per_patient = np.random.randint(1, 4, len(patient_ids))
+    treatment_patients.append(np.repeat(np.arange(len(patient_ids)), per_patient))
+    planned += len(treatment_patients[-1])
+treatment_patients = np.concatenate(treatment_patients)[:TARGET_TREATMENTS]
+
+def generate_treatment_batch(start):
+    """CSV rows for treatments[start:start + BATCH_SIZE]. Runs in worker processes, so it has
+    its own RNG streams keyed by `start`: the output does not depend on which worker runs it."""
+    rng = np.random.default_rng([42, start])
+    _seed_jit_rng(42 + start)
+    pt_ix = treatment_patients[start:start + BATCH_SIZE]
+    n = len(pt_ix)
+    ab_ix = rng.integers(0, len(antibiotic_list), n)
+    pa_ix = rng.integers(0, len(pathogen_list), n)
+    dose = np.round(antibiotic_doses[ab_ix] * rng.uniform(0.8, 1.2, n)).astype(np.int64)
+    duration = rng.choice(DURATIONS, n)
+    prev_abx = rng.poisson(0.4, n)
+    wbc, neutrophils_pct, crp, resistant, prob = simulate_treatments(
+        patient_blood_cancer[pt_ix], pathogen_hard[pa_ix], antibiotic_meropenem[ab_ix], prev_abx)
+
+    boosted = rng.random(n) < RESISTANT_BOOST
+    resistant[boosted] = 1
+    prob[boosted] = np.maximum(prob[boosted], 0.8)
+    stay_base = np.where(boosted, rng.normal(14, 5, n), rng.normal(7, 3, n))
+    stay_extra = np.where(boosted, rng.integers(7, 16, n),
+                          np.where(resistant == 1, rng.integers(7, 26, n), rng.integers(0, 6, n)))
+    stay = np.maximum(1, stay_base).astype(np.int64) + stay_extra
+
+    admission_date = start_day + rng.integers(0, days_span + 1, n).astype("timedelta64[D]")
+
+    # .tolist(): plain Python values format faster than numpy scalars in the CSV writer
+    return n, csv_payload(zip(
+        patient_ids[pt_ix].tolist(), antibiotic_ids[ab_ix].tolist(), pathogen_ids[pa_ix].tolist(),
+        dose.tolist(), duration.tolist(), prev_abx.tolist(),
+        wbc.tolist(), neutrophils_pct.tolist(), crp.tolist(), resistant.tolist(), prob.tolist(),
+        stay.tolist(), admission_date.tolist(),
+    ))
 
+# Batches are generated in parallel and COPY'd here in order by the one connection. Workers
+# are forked so they inherit the patient/lookup arrays without pickling (and never re-run this
+# script, as spawn would); where fork is unavailable, batches are generated in this process.
+# At most GEN_IN_FLIGHT batches are queued or finished-but-not-COPY'd at a time, so workers
+# that outrun the COPY wait instead of buffering every generated batch in this process.
+GEN_IN_FLIGHT = 2 * GEN_WORKERS
+
+def bounded_imap(pool, fn, args, max_in_flight):
+    """Like pool.imap (results in order), with at most max_in_flight tasks submitted ahead."""
+    pending = deque()
+    for arg in args:
+        pending.append(pool.apply_async(fn, (arg,)))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+batch_starts = range(0, TARGET_TREATMENTS, BATCH_SIZE)
+gen_pool = None
+if GEN_WORKERS > 1 and "fork" in multiprocessing.get_all_start_methods():
+    gen_pool = multiprocessing.get_context("fork").Pool(GEN_WORKERS)
+    batches = bounded_imap(gen_pool, generate_treatment_batch, batch_starts, GEN_IN_FLIGHT)
+else:
+    batches = map(generate_treatment_batch, batch_starts)
+
+inserted = 0
+for n, payload in batches:
+    copy_csv("treatments", TREATMENT_COLUMNS, payload)
+    inserted += n
+    print(f"Inserted treatments: {inserted}/{TARGET_TREATMENTS}")
+if gen_pool is not None:
+    gen_pool.close()
+    gen_pool.join()
+
+# -------------------- REBUILD INDEXES AND FOREIGN KEYS --------------------
+print("Rebuilding indexes and foreign keys...")
+for indexdef, _ in load_indexes:
+    cursor.execute(indexdef)
+for table, name, definition in load_fkeys:
+    # NOT VALID + VALIDATE: the check runs as one pass over the loaded rows
+    cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {} NOT VALID").format(
+        sql.SQL(table), sql.Identifier(name), sql.SQL(definition)))
+    cursor.execute(sql.SQL("ALTER TABLE {} VALIDATE CONSTRAINT {}").format(sql.SQL(table), sql.Identifier(name)))
+
+conn.commit()
 cursor.close()
 conn.close()
 print(f"✅ Database setup complete: {NEW_PATIENTS} patients and {TARGET_TREATMENTS} treatments generated!")
@@ -12,7 +12,16 @@ conn = psycopg2.connect(
     port=os.getenv("POSTGRES_PORT")
 )
 
-cur = conn.cursor()
-cur.execute("SELECT hospital_id, name, region, status FROM public.hospitals ORDER BY hospital_id")
-print(cur.fetchall())
+PRINT_LIMIT = 1000  # rows printed at most
+
+# Named (server-side) cursor: rows are streamed itersize at a time instead of fetchall()
+# pulling the whole table into client memory
+with conn.cursor(name="stream_hospitals") as cur:
+    cur.itersize = 10000
+    cur.execute(
+        "SELECT hospital_id, name, region, status FROM public.hospitals ORDER BY hospital_id LIMIT %s",
+        (PRINT_LIMIT,),
+    )
+    for row in cur:
+        print(row)
 conn.close()
@@ -1,5 +1,6 @@
 # src/train_model_final_v9_ultra.py
 import os
+import json
 import psycopg2
 import pandas as pd
 import numpy as np
@@ -43,8 +44,20 @@ LIMIT 1500000;
 """
 
 print("Loading data...")
-df = pd.read_sql_query(query, conn)
+# Named (server-side) cursor: rows arrive in FETCH_CHUNK batches, each turned into a DataFrame
+# right away, instead of buffering the whole result set client-side first
+FETCH_CHUNK = 100_000
+chunks = []
+with conn.cursor(name="train_model_rows") as cur:
+    cur.itersize = FETCH_CHUNK
+    cur.execute(query)
+    columns = None
+    while rows := cur.fetchmany(FETCH_CHUNK):
+        columns = columns or [d[0] for d in cur.description]
+        chunks.append(pd.DataFrame(rows, columns=columns))
 conn.close()
+df = pd.concat(chunks, ignore_index=True, copy=False)
+del chunks
 print(f"Loaded {len(df):,} records")
 
 df.dropna(subset=["age", "weight_kg", "duration_days"], inplace=True)
@@ -62,30 +75,46 @@ df[categorical_cols] = df[categorical_cols].fillna("missing").astype(str)
 df["admission_year"] = df["admission_date"].dt.year.fillna(0).astype(int)
 df["admission_month"] = df["admission_date"].dt.month.fillna(0).astype(int)
 
-def month_to_season(m):
-    if m in (12, 1, 2): return 0
-    if m in (3, 4, 5): return 1
-    if m in (6, 7, 8): return 2
-    if m in (9, 10, 11): return 3
-    return -1
-
-df["season"] = df["admission_month"].apply(month_to_season).astype(int)
-
-df["region_pathogen"] = df["region"] + "_" + df["pathogen_id"].astype(str)
-df["region_antibiotic"] = df["region"] + "_" + df["antibiotic_id"].astype(str)
-df["antibiotic_cancer"] = df["antibiotic_id"].astype(str) + "_" + df["cancer_type"].astype(str)
+# Season by month (index 0 = unknown date): winter 0, spring 1, summer 2, autumn 3
+SEASON_LUT = np.array([-1, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0], dtype=np.int8)
+df["season"] = SEASON_LUT[df["admission_month"].to_numpy()]
+
+def build_interaction(left, right, top_n=5000):
+    """"{left}_{right}" labels (all but the top_n most frequent pairs -> "other") and their integer codes.
+    Pairs are counted as int64 codes; only one label string is formatted per distinct pair."""
+    left_codes, left_uniq = pd.factorize(left, sort=False, use_na_sentinel=False)
+    right_codes, right_uniq = pd.factorize(right, sort=False, use_na_sentinel=False)
+    pair_codes, pair_uniq = pd.factorize(left_codes.astype(np.int64) * len(right_uniq) + right_codes, sort=False)
+    labels = np.array(
+        [f"{left_uniq[p // len(right_uniq)]}_{right_uniq[p % len(right_uniq)]}" for p in pair_uniq], dtype=object
+    )
+
+    counts = np.bincount(pair_codes)
+    if len(counts) > top_n:
+        keep = np.zeros(len(counts), dtype=bool)
+        keep[np.argsort(-counts, kind="stable")[:top_n]] = True
+        labels[~keep] = "other"
+        # Re-code so every "other" pair shares one code
+        label_codes = pd.factorize(labels, sort=False)[0]
+        return labels[pair_codes], label_codes[pair_codes]
+    return labels[pair_codes], pair_codes
 
 interaction_cols = ["region_pathogen", "region_antibiotic", "antibiotic_cancer"]
 
-for col in interaction_cols:
-    top = df[col].value_counts().nlargest(5000).index
-    df[col] = df[col].where(df[col].isin(top), "other")
+# Integer codes per encoded column, shared by frequency and target encoding
+codes = {col: pd.factorize(df[col].values, sort=False)[0] for col in categorical_cols}
+for col, left, right in (
+    ("region_pathogen", "region", "pathogen_id"),
+    ("region_antibiotic", "region", "antibiotic_id"),
+    ("antibiotic_cancer", "antibiotic_id", "cancer_type"),
+):
+    df[col], codes[col] = build_interaction(df[left].values, df[right].values)
 
 freq_cols = []
 for col in categorical_cols + interaction_cols:
     freq_col = f"{col}_freq"
-    vc = df[col].value_counts()
-    df[freq_col] = df[col].map(vc).astype(float) / vc.max()
+    counts = np.bincount(codes[col])
+    df[freq_col] = counts[codes[col]] / counts.max()
     freq_cols.append(freq_col)
 
 # -----------------------------------------------------
@@ -95,43 +124,67 @@ y_array = df["resistant"].values
 kf = KFold(n_splits=5, shuffle=True, random_state=42)
 te_cols = []
 
+global_mean = y_array.mean()
+folds = list(kf.split(y_array))
+
 for col in categorical_cols + interaction_cols:
     te_col = f"{col}_target_enc"
     te_cols.append(te_col)
 
-    values = df[col].values
+    # Per fold, category sums/counts are two bincounts over the integer codes
+    col_codes = codes[col]
+    n_categories = col_codes.max() + 1
     te_result = np.zeros(len(df), dtype=float)
-    global_mean = y_array.mean()
-
-    for train_idx, valid_idx in kf.split(values):
-        # Compute means on train fold (fast)
-        train_values = values[train_idx]
-        train_targets = y_array[train_idx]
 
-        means = pd.DataFrame({
-            "col": train_values,
-            "target": train_targets
-        }).groupby("col")["target"].mean()
+    for train_idx, valid_idx in folds:
+        train_codes = col_codes[train_idx]
+        sums = np.bincount(train_codes, weights=y_array[train_idx], minlength=n_categories)
+        counts = np.bincount(train_codes, minlength=n_categories)
 
-        # Map and fill NaN with global mean
-        te_result[valid_idx] = np.array(
-            pd.Series(values[valid_idx]).map(means).fillna(global_mean)
-        )
+        # Categories absent from the train fold fall back to the global mean
+        means = np.full(n_categories, global_mean)
+        seen = counts > 0
+        means[seen] = sums[seen] / counts[seen]
+        te_result[valid_idx] = means[col_codes[valid_idx]]
 
     df[te_col] = te_result
 
+# Full-data maps for inference: predict.py looks each category up in these instead of using
+# constant fallbacks. Unseen categories there get frequency 0 and the global mean.
+encoders = {"freq": {}, "te": {}, "te_global_mean": float(global_mean), "top": {}}
+for col in categorical_cols + interaction_cols:
+    col_codes = codes[col]
+    labels = np.empty(col_codes.max() + 1, dtype=object)
+    labels[col_codes] = df[col].to_numpy()
+    counts = np.bincount(col_codes)
+    sums = np.bincount(col_codes, weights=y_array)
+    encoders["freq"][col] = dict(zip(labels.tolist(), (counts / counts.max()).tolist()))
+    encoders["te"][col] = dict(zip(labels.tolist(), (sums / counts).tolist()))
+for col in interaction_cols:
+    # Pairs kept as their own category; anything else is "other"
+    encoders["top"][col] = sorted(set(encoders["freq"][col]) - {"other"})
+
 # -----------------------------------------------------
 
-df["weight_age_ratio"] = df["weight_kg"] / (df["age"] + 1)
-df["duration_log"] = np.log1p(df["duration_days"])
-df["weight_log"] = np.log1p(df["weight_kg"])
-df["age_log"] = np.log1p(df["age"])
-df["weight_sq"] = df["weight_kg"] ** 2
-df["age_sq"] = df["age"] ** 2
-df["duration_sq"] = df["duration_days"] ** 2
-df["age_duration"] = df["age"] * df["duration_days"]
-df["weight_duration"] = df["weight_kg"] * df["duration_days"]
-df["age_bin"] = pd.cut(df["age"], bins=[0,20,40,60,80,120], labels=False).astype(str)
+# Engineered features: computed on plain arrays and added in one concat, not ten column inserts
+age_arr = df["age"].to_numpy()
+weight_arr = df["weight_kg"].to_numpy()
+duration_arr = df["duration_days"].to_numpy()
+# Buckets (..20], (20,40], (40,60], (60,80], (80..) as "0".."4", the same labels predict.py builds
+AGE_BIN_LABELS = np.array(["0", "1", "2", "3", "4"], dtype=object)
+engineered = {
+    "weight_age_ratio": weight_arr / (age_arr + 1),
+    "duration_log": np.log1p(duration_arr),
+    "weight_log": np.log1p(weight_arr),
+    "age_log": np.log1p(age_arr),
+    "weight_sq": weight_arr * weight_arr,
+    "age_sq": age_arr * age_arr,
+    "duration_sq": duration_arr * duration_arr,
+    "age_duration": age_arr * duration_arr,
+    "weight_duration": weight_arr * duration_arr,
+    "age_bin": AGE_BIN_LABELS[np.digitize(age_arr, [20, 40, 60, 80], right=True)],
+}
+df = pd.concat([df, pd.DataFrame(engineered, index=df.index)], axis=1)
 
 features = []
 features += numeric_cols
@@ -148,12 +201,16 @@ features += [
 
 features = [f for f in features if f in df.columns]
 
-X = df[features]
 y = df["resistant"].astype(int)
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, stratify=y, random_state=42
+# Split row positions, then take rows and feature columns (already in `features` order) in one
+# pass per side, instead of first copying df[features] and then copying again for the split
+train_idx, test_idx = train_test_split(
+    np.arange(len(df)), test_size=0.2, stratify=y, random_state=42
 )
+feature_pos = df.columns.get_indexer(features)
+X_train, X_test = df.iloc[train_idx, feature_pos], df.iloc[test_idx, feature_pos]
+y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
 
 median_values = X_train.median(numeric_only=True)
 X_train = X_train.fillna(median_values)
@@ -164,6 +221,12 @@ cat_features_for_cb = [
     if c in X_train.columns
 ]
 
+# CatBoost keeps float features as float32 and reads a DataFrame column by column: hand it
+# float32 columns so Pool construction skips the float64 -> float32 copy (and half the memory)
+numeric_feats = [c for c in X_train.columns if c not in cat_features_for_cb]
+X_train = X_train.astype({c: np.float32 for c in numeric_feats})
+X_test = X_test.astype({c: np.float32 for c in numeric_feats})
+
 train_pool = Pool(X_train, y_train, cat_features=cat_features_for_cb)
 test_pool = Pool(X_test, y_test, cat_features=cat_features_for_cb)
 
@@ -198,3 +261,7 @@ print(f"F1 Score: {f1:.4f}")
 
 model.save_model("training_final_v9_ultra.cbm")
 print("\n📦 Saved model: training_final_v9_ultra.cbm")
+
+with open("training_final_v9_ultra.encoders.json", "w") as f:
+    json.dump(encoders, f)
+print("📦 Saved encoders: training_final_v9_ultra.encoders.json")
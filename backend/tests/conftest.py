@@ -0,0 +1,24 @@
+# tests/conftest.py
+"""
+Shared setup for importing the apps without their runtime dependencies: env defaults
+for the required settings, and a stand-in for src.predict when the trained model (a large
+LFS file) cannot be loaded, so the API tests still run; the prediction tests skip then.
+Tests drive the apps without their lifespan, so no DB pool, Redis or hashing pool is opened.
+"""
+import os
+import sys
+import types
+import importlib
+
+for key, value in {
+    "POSTGRES_DB": "test",
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "JWT_SECRET": "test-secret-at-least-32-bytes-long",
+}.items():
+    os.environ.setdefault(key, value)
+
+try:
+    importlib.import_module("src.predict")
+except Exception:  # e.g. the .cbm is still an un-pulled LFS pointer
+    sys.modules["src.predict"] = types.SimpleNamespace(predict_resistance=None)
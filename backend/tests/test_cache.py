@@ -0,0 +1,101 @@
+# tests/test_cache.py
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+from src import cache
+
+KEY = cache.DOCTORS_KEY
+PAGE = "None:0"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(cache, "client", fake)
+    return fake
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _rows(body: bytes) -> list:
+    return json.loads(body)
+
+
+def test_miss_caches_and_hit_skips_loader(client):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return [{"id": "000001"}]
+
+    first = _run(cache.get_or_load(KEY, PAGE, loader))
+    second = _run(cache.get_or_load(KEY, PAGE, loader))
+    assert _rows(first.body) == _rows(second.body) == [{"id": "000001"}]
+    assert len(calls) == 1
+
+
+def test_invalidation_between_read_and_write_skips_hset(client):
+    async def racing_loader():
+        # A write commits and invalidates after the cache read, while this loader holds old rows
+        await cache.invalidate(KEY)
+        return [{"id": "000001", "name": "old"}]
+
+    response = _run(cache.get_or_load(KEY, PAGE, racing_loader))
+    assert _rows(response.body) == [{"id": "000001", "name": "old"}]
+    assert _run(client.hgetall(KEY)) == {}
+
+    async def loader():
+        return [{"id": "000001", "name": "new"}]
+
+    assert _rows(_run(cache.get_or_load(KEY, PAGE, loader)).body) == [{"id": "000001", "name": "new"}]
+    assert _run(client.hget(KEY, f"body:{PAGE}")) is not None
+
+
+def test_invalidate_drops_every_page_and_bumps_generation(client):
+    async def loader():
+        return []
+
+    _run(cache.get_or_load(KEY, "a", loader))
+    _run(cache.get_or_load(KEY, "b", loader))
+    _run(cache.invalidate(KEY))
+    assert _run(client.exists(KEY)) == 0
+    assert _run(client.get(f"{KEY}:gen")) == b"1"
+
+
+def test_loader_failure_serves_stale_body(client):
+    async def loader():
+        return [{"id": "000001"}]
+
+    _run(cache.get_or_load(KEY, PAGE, loader, ttl=0))  # cached, but stale right away
+
+    async def failing_loader():
+        raise RuntimeError("db down")
+
+    response = _run(cache.get_or_load(KEY, PAGE, failing_loader))
+    assert _rows(response.body) == [{"id": "000001"}]
+
+
+def test_loader_failure_without_stale_body_reraises(client):
+    async def failing_loader():
+        raise RuntimeError("db down")
+
+    with pytest.raises(RuntimeError, match="db down"):
+        _run(cache.get_or_load(KEY, PAGE, failing_loader))
+
+
+def test_without_redis_loader_runs_every_time(monkeypatch):
+    monkeypatch.setattr(cache, "client", None)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return [{"id": "000001"}]
+
+    _run(cache.get_or_load(KEY, PAGE, loader))
+    _run(cache.get_or_load(KEY, PAGE, loader))
+    assert len(calls) == 2
@@ -0,0 +1,74 @@
+# tests/test_decode_token.py
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from src import api
+
+
+def _segment(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _signed(header, payload) -> str:
+    """HS256 token over arbitrary JSON values, signed with the app's secret."""
+    signing_input = f"{_segment(json.dumps(header).encode())}.{_segment(json.dumps(payload).encode())}"
+    signature = hmac.new(api.JWT_SECRET.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{_segment(signature)}"
+
+
+HEADER = {"alg": "HS256", "typ": "JWT"}
+
+MALFORMED_TOKENS = [
+    "",
+    "not-a-token",
+    "a.b",
+    "a.b.c",
+    "é.é.é",
+    _signed([], {"sub": "123456", "exp": time.time() + 60}),
+    _signed("x", {"sub": "123456", "exp": time.time() + 60}),
+    _signed(HEADER, []),
+    _signed(HEADER, "x"),
+    _signed(HEADER, {"sub": "123456"}),
+    _signed(HEADER, {"sub": "123456", "exp": "tomorrow"}),
+    _signed({"alg": "none"}, {"sub": "123456", "exp": time.time() + 60}),
+]
+
+
+@pytest.mark.parametrize("token", MALFORMED_TOKENS)
+def test_malformed_token_is_rejected_with_401(token):
+    with pytest.raises(HTTPException) as exc:
+        api.decode_token(token)
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.parametrize("token", MALFORMED_TOKENS)
+def test_validate_endpoint_returns_401_for_malformed_token(token):
+    response = TestClient(api.app).post("/session/validate", params={"token": token})
+    assert response.status_code == 401
+
+
+def test_token_with_bad_signature_is_rejected():
+    token = api.create_access_token("123456")
+    with pytest.raises(HTTPException) as exc:
+        api.decode_token(token[:-2] + ("AA" if not token.endswith("AA") else "BB"))
+    assert exc.value.status_code == 401
+
+
+def test_expired_token_is_rejected():
+    token = _signed(HEADER, {"sub": "123456", "exp": time.time() - 1})
+    with pytest.raises(HTTPException) as exc:
+        api.decode_token(token)
+    assert exc.value.detail == "Token expired"
+
+
+def test_valid_token_decodes():
+    payload = api.decode_token(api.create_access_token("123456"))
+    assert payload["sub"] == "123456"
+    assert payload["type"] == "access"
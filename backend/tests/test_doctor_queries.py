@@ -0,0 +1,75 @@
+# tests/test_doctor_queries.py
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from src import doctor_queries
+from src.schemas import DoctorBulkUpdateItem
+
+# Database tests run only against a throwaway Postgres, e.g.
+# TEST_DATABASE_URL="host=localhost dbname=atlas_test user=postgres"; everything they
+# create is rolled back
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+needs_db = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+
+def test_duplicate_doctor_id_is_rejected_before_any_query():
+    doctors = [DoctorBulkUpdateItem(doctor_id="100001", name="A"), DoctorBulkUpdateItem(doctor_id="100001", name="B")]
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(doctor_queries.bulk_update_doctors(None, doctors))
+    assert exc.value.status_code == 400
+
+
+async def _with_doctors(check):
+    import psycopg
+
+    async with await psycopg.AsyncConnection.connect(TEST_DATABASE_URL) as conn:
+        try:
+            await conn.execute("CREATE SCHEMA IF NOT EXISTS medportal")
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS medportal.doctors (
+                    id SERIAL PRIMARY KEY,
+                    doctor_id VARCHAR(6) UNIQUE NOT NULL,
+                    name TEXT, role TEXT, region TEXT, hospital TEXT, status TEXT,
+                    password_hash TEXT, updated_at TIMESTAMPTZ
+                )
+            """)
+            await conn.execute(
+                "INSERT INTO medportal.doctors (doctor_id, name, role, region, hospital, status, password_hash) "
+                "VALUES ('990001', 'Ann', 'Doctor', 'Ohio', 'H1', 'Active', 'x'), "
+                "('990002', 'Bob', 'Doctor', 'Texas', 'H2', 'Active', 'x')"
+            )
+            await check(conn)
+        finally:
+            await conn.rollback()
+
+
+@needs_db
+def test_bulk_update_keeps_omitted_fields_and_skips_unknown_ids():
+    async def check(conn):
+        rows = await doctor_queries.bulk_update_doctors(conn, [
+            DoctorBulkUpdateItem(doctor_id="990001", status="Inactive"),
+            DoctorBulkUpdateItem(doctor_id="990002", name="Robert", role="admin"),
+            DoctorBulkUpdateItem(doctor_id="990099", name="Nobody"),
+        ], capitalize_role=True)
+        by_id = {row["id"]: row for row in rows}
+        assert set(by_id) == {"990001", "990002"}
+        assert by_id["990001"] == {
+            "id": "990001", "name": "Ann", "role": "Doctor", "region": "Ohio", "hospital": "H1", "status": "Inactive",
+        }
+        assert by_id["990002"]["name"] == "Robert"
+        assert by_id["990002"]["role"] == "Admin"
+        assert by_id["990002"]["region"] == "Texas"
+
+    asyncio.run(_with_doctors(check))
+
+
+@needs_db
+def test_doctors_by_ids_returns_known_ids_in_order():
+    async def check(conn):
+        rows = await doctor_queries.doctors_by_ids(conn, ["990002", "990099", "990001"])
+        assert [row["id"] for row in rows] == ["990001", "990002"]
+
+    asyncio.run(_with_doctors(check))
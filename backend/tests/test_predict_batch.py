@@ -0,0 +1,48 @@
+# tests/test_predict_batch.py
+import math
+
+import pytest
+
+from src import predict
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(predict, "predict_resistance_batch"), reason="trained model could not be loaded"
+)
+
+ROWS = [
+    dict(age=35, weight_kg=67, gender="Male", admission_date="2025-11-28", cancer_type="Lung",
+         pathogen_id=1, antibiotic_id=1, duration_days=7, region="Ohio"),
+    dict(age=80, weight_kg=90.5, gender="Female", admission_date="2023-07-01", cancer_type="Leukemia",
+         pathogen_id=5, antibiotic_id=4, duration_days=14, region="Texas"),
+    dict(age=19, weight_kg=50, gender="Female", admission_date=None, cancer_type="Breast",
+         pathogen_id=3, antibiotic_id=8, duration_days=3, region="California"),
+    dict(age=130, weight_kg=120, gender="Male", admission_date="garbage", cancer_type="Colon",
+         pathogen_id=6, antibiotic_id=2, duration_days=10, region="Florida"),
+    dict(age=0, weight_kg=45, gender="Male", admission_date="2021-02-10", cancer_type="Prostate",
+         pathogen_id=2, antibiotic_id=6, duration_days=5, region="Illinois"),
+    dict(age=60, weight_kg=70, gender="Female", admission_date="2022-12-31", cancer_type="Lymphoma",
+         pathogen_id=4, antibiotic_id=7, duration_days=7, region="New York"),
+    dict(age=-5, weight_kg=-1, gender="Male", admission_date="2024-04-15", cancer_type="Lung",
+         pathogen_id=9, antibiotic_id=9, duration_days=-7, region="Nowhere"),
+    dict(age=math.nan, weight_kg=math.nan, gender="Female", admission_date="2024-08-15", cancer_type="Breast",
+         pathogen_id=1, antibiotic_id=3, duration_days=7, region="Ohio"),
+]
+# admission_date is optional in batch records: same as passing None per row
+ROW_WITHOUT_DATE = {k: v for k, v in ROWS[0].items() if k != "admission_date"}
+
+
+def test_batch_matches_single_row_calls():
+    assert predict.predict_resistance_batch(ROWS) == [predict.predict_resistance(**row) for row in ROWS]
+
+
+def test_batch_record_without_admission_date():
+    assert predict.predict_resistance_batch([ROW_WITHOUT_DATE]) == [
+        predict.predict_resistance(**ROW_WITHOUT_DATE)
+    ]
+    assert predict.predict_resistance_batch([ROW_WITHOUT_DATE]) == predict.predict_resistance_batch(
+        [dict(ROW_WITHOUT_DATE, admission_date=None)]
+    )
+
+
+def test_empty_batch():
+    assert predict.predict_resistance_batch([]) == []